@@ -0,0 +1,179 @@
+# analytics.py
+# Answer / outcome analytics without I/O on the request path.
+# Routes only append a small tuple to an in-memory ring buffer (one per started run and
+# one per answer, the last one with the winner); a background thread
+# flushes it every few seconds to an append-only binary log (one file per worker) and,
+# with a shared store, adds each batch's winner totals to the live counters.
+#
+#   python analytics.py report [--quiz slug] [log dir]
+#   python analytics.py live [--quiz slug] [--store SHARED_STORE]   (winner totals across nodes)
+from __future__ import annotations
+import argparse
+import atexit
+import glob
+import logging
+import os
+import struct
+import threading
+import time
+from collections import Counter, deque
+from typing import Iterator, Tuple
+
+from michel_quiz import QUIZ, QUIZ_DIR, answered_count, load_quiz
+from store import open_store
+
+log = logging.getLogger(__name__)
+
+# ts (unix seconds), progress (packed answers so far, see michel_quiz), winner id (0 = quiz not finished).
+# A run writes START when it begins and its progress after each answer.
+# quiz_compiler limits quizzes to what fits (MAX_QUESTIONS, MAX_CHARACTER_ID).
+RECORD = struct.Struct("<IQB")
+
+
+class Recorder:
+    # shared / counter_prefix: store whose <prefix><winner id> counters get the totals
+    def __init__(self, log_dir: str, capacity: int = 65536, flush_interval: float = 2.0,
+                 shared=None, counter_prefix: str = "winners:"):
+        self.log_dir = log_dir
+        self.flush_interval = flush_interval
+        self.shared = shared
+        self.counter_prefix = counter_prefix
+        self.buffer: deque = deque(maxlen=capacity)  # full buffer drops the oldest records
+        self._pid = None
+
+    def record(self, progress: int, winner_id: int = 0) -> None:
+        self.buffer.append((int(time.time()), progress, winner_id))
+        if self._pid != os.getpid():  # first record in this (possibly forked) worker
+            self._start()
+
+    def _start(self) -> None:
+        self._pid = os.getpid()
+        os.makedirs(self.log_dir, exist_ok=True)
+        threading.Thread(target=self._run, name="analytics-flush", daemon=True).start()
+        atexit.register(self.flush)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:  # e.g. disk full: keep the thread alive, retry next round
+                log.exception("analytics flush to %s failed", self.log_dir)
+
+    def flush(self) -> int:
+        out = bytearray()
+        winners: Counter = Counter()
+        while self.buffer:
+            try:
+                item = self.buffer.popleft()
+            except IndexError:
+                break
+            try:
+                out += RECORD.pack(*item)
+            except struct.error as e:  # doesn't fit the record: drop just this one
+                log.warning("analytics record %r dropped: %s", item, e)
+            if item[2]:
+                winners[item[2]] += 1
+        if out:
+            with open(os.path.join(self.log_dir, f"answers-{os.getpid()}.bin"), "ab") as f:
+                f.write(out)
+        if self.shared is not None:
+            for winner_id, n in winners.items():  # one round-trip per Michel per batch
+                self.shared.incr(f"{self.counter_prefix}{winner_id}", n)
+        return len(out) // RECORD.size
+
+
+def read_logs(log_dir: str) -> Iterator[Tuple[int, int, int]]:
+    for path in sorted(glob.glob(os.path.join(log_dir, "answers-*.bin"))):
+        with open(path, "rb") as f:
+            data = f.read()
+        usable = len(data) - len(data) % RECORD.size  # ignore a torn final record
+        yield from RECORD.iter_unpack(data[:usable])
+
+
+def aggregate(records, quiz=QUIZ) -> dict:
+    picks = [Counter() for _ in quiz.questions]   # q_idx -> option index -> count
+    winners: Counter = Counter()
+    reached: Counter = Counter()              # n -> runs that answered n questions (0: started)
+    finished: Counter = Counter()             # (winner id, progress) -> runs
+    for _, progress, winner_id in records:
+        n = answered_count(progress)
+        reached[n] += 1
+        if 0 < n <= len(picks):  # each record adds one answer: the last one
+            picks[n - 1][progress & 3] += 1
+        if winner_id:
+            winners[winner_id] += 1
+            finished[winner_id, progress] += 1
+
+    # Drop-off at question q: runs that got to it (answered q before) but never answered it.
+    # Runs still in progress when the logs were read count as dropped.
+    funnel = [reached[q_idx] for q_idx in range(len(quiz.questions) + 1)]
+    dropped_at = Counter({q_idx: max(funnel[q_idx] - funnel[q_idx + 1], 0) for q_idx in range(len(quiz.questions))})
+
+    # The punchlines each finished run was shown, resolved in one batch
+    runs = list(finished.items())
+    punchlines: Counter = Counter()
+    shown = quiz.pick_punchlines_many((w, quiz.progress_traits(p)) for (w, p), _ in runs)
+    for (_, n), lines in zip(runs, shown):
+        for line in lines:
+            punchlines[line] += n
+    return {"picks": picks, "winners": winners, "funnel": funnel, "dropped_at": dropped_at,
+            "punchlines": punchlines}
+
+
+def print_report(agg: dict, quiz=QUIZ) -> None:
+    completed = sum(agg["winners"].values())
+    print(f"started: {agg['funnel'][0]}, completed: {completed}, abandoned: {sum(agg['dropped_at'].values())}\n")
+
+    print("Pick rates per question")
+    for q, counts in zip(quiz.questions, agg["picks"]):
+        total = sum(counts.values()) or 1
+        rates = "  ".join(f"{o.key}={100 * counts[i] / total:5.1f}%" for i, o in enumerate(q.options))
+        print(f"  Q{q.id:<3} {rates}   ({sum(counts.values())})")
+
+    print("\nWinners")
+    for m in quiz.michels:
+        print(f"  {m.name:<26} {agg['winners'][m.id]:>8} {100 * agg['winners'][m.id] / (completed or 1):6.1f}%")
+
+    print("\nFunnel (runs that reached each question, and left before answering it)")
+    for q_idx in range(len(quiz.questions)):
+        reached, dropped = agg["funnel"][q_idx], agg["dropped_at"][q_idx]
+        print(f"  Q{q_idx + 1:<3} {reached:>8}   dropped {dropped:>8} {100 * dropped / (reached or 1):6.1f}%")
+
+    print("\nMost shown punchlines")
+    for line, n in agg["punchlines"].most_common(10):
+        print(f"  {n:>8}  {line}")
+
+
+def print_live(shared, quiz=QUIZ) -> None:
+    # Counters each worker's Recorder adds its finished runs to (flushed every few seconds)
+    totals = {m.id: int(shared.get(f"winners:{quiz.slug}:{m.id}") or 0) for m in quiz.michels}
+    completed = sum(totals.values())
+    print(f"completed quizzes (all nodes): {completed}\n")
+    for m in quiz.michels:
+        print(f"  {m.name:<26} {totals[m.id]:>8} {100 * totals[m.id] / (completed or 1):6.1f}%")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Quiz answer analytics")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("report")
+    p.add_argument("--quiz", default=QUIZ.slug, help="quiz slug (quizzes/<slug>.json)")
+    p.add_argument("log_dir", nargs="?", help="default: instance/analytics/<slug>")
+    p = sub.add_parser("live")
+    p.add_argument("--quiz", default=QUIZ.slug, help="quiz slug (quizzes/<slug>.json)")
+    p.add_argument("--store", default=os.environ.get("SHARED_STORE"), help="default: $SHARED_STORE")
+    args = parser.parse_args()
+    quiz = QUIZ if args.quiz == QUIZ.slug else load_quiz(os.path.join(QUIZ_DIR, f"{args.quiz}.json"))
+    if args.cmd == "report":
+        log_dir = args.log_dir or os.path.join("instance", "analytics", quiz.slug)
+        print_report(aggregate(read_logs(log_dir), quiz), quiz)
+    elif args.cmd == "live":
+        shared = open_store(args.store)
+        if shared is None:
+            parser.error("live needs --store or SHARED_STORE")
+        print_live(shared, quiz)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,63 +1,270 @@
-from flask import Flask, render_template, request, redirect, url_for, session
-import secrets
+from flask import Flask, abort, g, render_template, request, redirect, url_for, session
+from collections import OrderedDict
+from functools import wraps
+import hashlib
+import os
+import threading
+import weakref
 
-from michel_quiz import QUESTIONS, empty_traits, add_traits, rank_michels, pick_punchlines
+from assets import init_assets
+from analytics import Recorder
+import media
+from metrics import init_metrics, register_cache, span
+from sessions import init_sessions
+import store
+from michel_quiz import DEFAULT_QUIZ_FILE, QUIZ_DIR, QuizRegistry, START, record_answer, answered_count
 
 
-app = Flask(__name__)
-app.secret_key = secrets.token_hex(16)
+# INSTANCE_PATH: per-node state dir (key file, analytics, sessions.db) when several nodes share a checkout
+app = Flask(__name__, instance_path=os.environ.get("INSTANCE_PATH"))
+
+# Shared key + cache tier for multi-node deployments (SHARED_STORE unset: everything stays per process)
+SHARED = store.open_store(os.environ.get("SHARED_STORE"))
+
+init_sessions(app, SHARED)  # shared signing key (+ optional server-side store), see sessions.py
+init_assets(app)  # content-hashed static URLs, see assets.py
+init_metrics(app)  # request/span histograms and cache counters on /metrics, see metrics.py
+
+# -------------------------
+# Quizzes
+# Every quizzes/<slug>.json is served under /<slug>/...; the default quiz (michel)
+# also keeps the bare URLs (/, /question, /result, /reset).
+# Each definition is re-checked at most once a second: `python quiz_compiler.py
+# quizzes/<slug>.json` swaps it in without a restart. Every cache below takes the
+# quiz as part of its key, so a swap never serves stale pages.
+# -------------------------
+def _quiz_error(e):
+    app.logger.error("quiz load failed: %s", e)
+
+def _quiz_swapped(old, new):
+    # Page caches hang off the quiz and go with it; the result caches are shared
+    # LRUs, so they are emptied to release the old quiz right away.
+    app.logger.info("quiz %s swapped: %s -> %s", new.slug, old.version[:12], new.version[:12])
+    _result_page.cache_clear()
+    _result_context.cache_clear()
+
+DEFAULT_QUIZ_FILE.on_error = _quiz_error
+DEFAULT_QUIZ_FILE.on_swap = _quiz_swapped
+QUIZZES = QuizRegistry([DEFAULT_QUIZ_FILE])
+QUIZZES.scan(QUIZ_DIR, on_error=_quiz_error, on_swap=_quiz_swapped)
+DEFAULT_QUIZ = DEFAULT_QUIZ_FILE.quiz.slug
+
+@app.url_value_preprocessor
+def _load_quiz(endpoint, values):
+    slug = values.pop("quiz", DEFAULT_QUIZ) if values else DEFAULT_QUIZ
+    g.quiz = QUIZZES.get(slug)
+    if g.quiz is None:
+        abort(404)
+
+@app.url_defaults
+def _quiz_in_urls(endpoint, values):
+    # url_for("question") inside a quiz links to the same quiz
+    if "quiz" not in values and "quiz" in g and app.url_map.is_endpoint_expecting(endpoint, "quiz"):
+        values["quiz"] = g.quiz.slug
+
+def _quiz_route(rule, **options):
+    # Registers rule for the default quiz and /<quiz>rule for every quiz
+    def decorator(view):
+        app.add_url_rule(rule, view_func=view, defaults={"quiz": DEFAULT_QUIZ}, **options)
+        app.add_url_rule(f"/<quiz>{rule}", view_func=view, **options)
+        return view
+    return decorator
+
+def _progress_key():
+    # Runs of different quizzes live side by side in one session
+    return "progress" if g.quiz.slug == DEFAULT_QUIZ else f"progress:{g.quiz.slug}"
+
+# -------------------------
+# Rendered page cache
+# Pages are plain functions of their inputs, so the rendered HTML is cached and
+# keyed by (template version, inputs): a cache hit does no Jinja work at all.
+# -------------------------
+_TEMPLATE_VERSIONS = {}
+
+def _template_version(name):
+    # With template auto-reload on (debug), re-hash so edits show up immediately
+    if name not in _TEMPLATE_VERSIONS or app.jinja_env.auto_reload:
+        source, _, _ = app.jinja_loader.get_source(app.jinja_env, name)
+        _TEMPLATE_VERSIONS[name] = hashlib.sha1(source.encode("utf-8")).hexdigest()[:12]
+    return _TEMPLATE_VERSIONS[name]
+
+# Per-quiz memo tables: they hang off the Quiz object (weakly), so a hot-swapped
+# quiz is freed together with everything rendered for it.
+_PER_QUIZ = weakref.WeakKeyDictionary()
+_MISSING = object()
+
+def per_quiz_cache(fn):
+    # fn(quiz, *args) memoized per quiz, unbounded: every key is finite per quiz
+    @wraps(fn)
+    def cached(quiz, *args):
+        memo = _PER_QUIZ.get(quiz)
+        if memo is None:
+            memo = _PER_QUIZ.setdefault(quiz, {})
+        key = (fn.__name__, *args)
+        value = memo.get(key, _MISSING)
+        if value is _MISSING:
+            value = memo[key] = fn(quiz, *args)
+        return value
+    return cached
+
+@per_quiz_cache
+def _home_page(quiz, version):
+    with span("render_template"):
+        return render_template("home.html", total_questions=len(quiz.questions))
+
+@per_quiz_cache
+def _question_page(quiz, version, q_idx, leader_id=None):
+    # leader_id: the Michel currently in front (None before the first answer moves anything)
+    with span("render_template"):
+        return render_template(
+            "question.html",
+            q_idx=q_idx,
+            total=len(quiz.questions),
+            question=quiz.questions[q_idx],
+            leader=quiz.michels_by_id.get(leader_id)
+        )
+
+def precompile_templates():
+    # Every template parsed + compiled into Jinja's cache (and hashed for the page
+    # cache keys) up front, so no request pays for compilation
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+        _template_version(name)
+
+def prerender_pages():
+    for slug in QUIZZES:
+        with app.test_request_context("/"):
+            quiz = g.quiz = QUIZZES.get(slug)
+            _home_page(quiz, _template_version("home.html"))
+            for q_idx in range(len(quiz.questions)):
+                # every possible leader preview, too (None = no trait has moved yet)
+                for leader_id in [None] + ([m.id for m in quiz.michels] if q_idx else []):
+                    _question_page(quiz, _template_version("question.html"), q_idx, leader_id)
+
+# Answers + outcomes go to an in-memory ring buffer per quiz, flushed to disk by a background thread
+ANALYTICS_DIR = os.environ.get("ANALYTICS_DIR") or os.path.join(app.instance_path, "analytics")
+# With a shared store, the flush thread also adds winner totals to winners:<slug>:<id>
+ANALYTICS = {
+    slug: Recorder(os.path.join(ANALYTICS_DIR, slug), shared=SHARED, counter_prefix=f"winners:{slug}:")
+    for slug in QUIZZES
+}
 
 def _init_quiz():
-    session["q_idx"] = 0
-    session["traits"] = empty_traits()
-    session["answers"] = []  # store (question_id, option_key) if you want
+    # Only the packed answer sequence lives in the cookie; q_idx and traits are derived from it
+    session[_progress_key()] = START
+    ANALYTICS[g.quiz.slug].record(START)  # one more run started (the top of the drop-off funnel)
 
-@app.route("/", methods=["GET", "POST"])
+@_quiz_route("/", methods=["GET", "POST"])
 def home():
     if request.method == "POST":
         _init_quiz()
         return redirect(url_for("question"))
-    return render_template("home.html", total_questions=len(QUESTIONS))
+    return _home_page(g.quiz, _template_version("home.html"))
 
-@app.route("/question", methods=["GET", "POST"])
+@_quiz_route("/question", methods=["GET", "POST"])
 def question():
     # Safety init (if user refreshes / lands here directly)
-    if "q_idx" not in session or "traits" not in session:
+    key = _progress_key()
+    if key not in session:
         _init_quiz()
 
-    q_idx = session["q_idx"]
+    quiz = g.quiz
+    progress = session[key]
+    q_idx = answered_count(progress)
 
     # Finished?
-    if q_idx >= len(QUESTIONS):
+    if q_idx >= len(quiz.questions):
         return redirect(url_for("result"))
 
-    q = QUESTIONS[q_idx]
+    q = quiz.questions[q_idx]
 
     if request.method == "POST":
         chosen = request.form.get("option")  # expects "A"/"B"/"C"/"D"
-        option = next((o for o in q.options if o.key == chosen), None)
-        if option:
-            session["traits"] = add_traits(session["traits"], option.delta)
-            session["answers"] = session.get("answers", []) + [(q.id, option.key)]
-            session["q_idx"] = q_idx + 1
+        option_idx = next((i for i, o in enumerate(q.options) if o.key == chosen), None)
+        if option_idx is not None:
+            progress = session[key] = record_answer(progress, option_idx)
+            winner_id = 0
+            if q_idx + 1 == len(quiz.questions):
+                # Last answer: log the winner too (the ranking is cached for the /result that follows)
+                traits_key = quiz.trait_vector(quiz.progress_traits(progress))
+                winner_id = _result_context(quiz, traits_key)["winner"].id
+            # Every answer is one record (an append to memory), so runs that are simply
+            # closed still show up in the funnel at the last question they answered
+            ANALYTICS[quiz.slug].record(progress, winner_id)
         return redirect(url_for("question"))
 
-    return render_template(
-        "question.html",
-        q_idx=q_idx,
-        total=len(QUESTIONS),
-        question=q
-    )
+    # Running scores are cached per answer prefix, so this is one O(n_michels) update per answer
+    with span("leader"):
+        leader = quiz.leader(quiz.progress_state(progress))
+    return _question_page(quiz, _template_version("question.html"), q_idx, leader.id if leader else None)
 
-@app.route("/result")
-def result():
-    if "traits" not in session:
-        return redirect(url_for("home"))
+# Responsive variants / video posters from `python media.py build` (empty if never built)
+MEDIA_MANIFEST = media.load_manifest()
 
-    ranked = rank_michels(session["traits"])  # list[(Michel, score)] sorted desc
+# Every Michel's media checked once per quiz: missing files fall back to a close match or no media at all
+@per_quiz_cache
+def _media_index(quiz):
+    index = media.build_index(quiz.michels, app.static_folder, app.extensions["assets"])
+    for m in quiz.michels:
+        if index[m.id].problem:
+            f = index[m.id]
+            app.logger.warning("media for %s (%s): %s -> %s", m.name, f.requested, f.problem, f.path)
+    return index
+
+for slug in QUIZZES:
+    _media_index(QUIZZES.get(slug))
+
+def counted_lru_cache(maxsize):
+    # lru_cache that counts its own evictions (lru_cache only reports hits/misses, and
+    # misses - currsize overcounts when two threads miss the same key at once)
+    def decorator(fn):
+        cache = OrderedDict()
+        lock = threading.Lock()
+        counts = {"hits": 0, "misses": 0, "evictions": 0}
+
+        @wraps(fn)
+        def cached(*args):
+            with lock:
+                if args in cache:
+                    counts["hits"] += 1
+                    cache.move_to_end(args)
+                    return cache[args]
+                counts["misses"] += 1
+            value = fn(*args)
+            with lock:
+                if args not in cache:  # another thread may have filled it meanwhile
+                    cache[args] = value
+                    if len(cache) > maxsize:
+                        cache.popitem(last=False)
+                        counts["evictions"] += 1
+            return value
+
+        def cache_stats():
+            with lock:
+                return {**counts, "size": len(cache), "maxsize": maxsize}
+
+        def cache_clear():
+            with lock:
+                cache.clear()
+
+        cached.cache_stats = cache_stats
+        cached.cache_clear = cache_clear
+        return cached
+    return decorator
+
+# The whole result page only depends on the final traits, so cache it per trait vector.
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", "4096"))
+
+@counted_lru_cache(RESULT_CACHE_SIZE)
+def _result_context(quiz, traits_key):
+    traits = dict(zip(quiz.traits, traits_key))
+
+    with span("rank_michels"):
+        ranked = quiz.rank_michels(traits)  # list[(Michel, score)] sorted desc
     winner, winner_score = ranked[0]
 
-    punchlines = pick_punchlines(winner.id, session["traits"])
+    with span("pick_punchlines"):
+        punchlines = quiz.pick_punchlines(winner.id, traits)
 
 
     # Convert scores to non-negative for percentage display
@@ -77,20 +284,76 @@ def result():
     # Full list (rounded to 1 decimal; also include bar width)
     full = [(m, s, round(p, 1)) for (m, s, p) in all_percent]
 
-    return render_template(
-        "result.html",
+    winner_file = _media_index(quiz)[winner.id]
+    return dict(
         winner=winner,
+        winner_file=winner_file,
+        winner_media=MEDIA_MANIFEST.get(winner_file.path, {}),
         winner_score=winner_score,
         top3=top3,
         full=full,
-        traits=session["traits"],
+        traits=traits,
         punchlines=punchlines
     )
 
-@app.route("/reset")
+# Rendered result pages (~14 KB each), keyed like the other cached pages
+RESULT_PAGE_CACHE_SIZE = int(os.environ.get("RESULT_PAGE_CACHE_SIZE", "1024"))
+# Pages published to a shared store expire; a deploy or quiz edit changes the key anyway
+RESULT_SHARED_TTL = float(os.environ.get("RESULT_SHARED_TTL", "3600"))
+# Only a store other nodes read is a second tier; SHARED_STORE=local would just be a
+# second, unbounded-by-RESULT_PAGE_CACHE_SIZE copy in every worker
+SHARED_PAGES = SHARED is not None and SHARED.shared
+
+@counted_lru_cache(RESULT_PAGE_CACHE_SIZE)
+def _result_page(version, quiz, traits_key):
+    # Second tier: a page another node already rendered
+    shared_key = f"result:{version}:{quiz.version}:{','.join(map(str, traits_key))}"
+    if SHARED_PAGES:
+        with span("shared_get"):
+            cached = SHARED.get(shared_key)
+        if cached is not None:
+            return cached.decode("utf-8")
+
+    context = _result_context(quiz, traits_key)
+    with span("render_template"):
+        page = render_template("result.html", **context)
+    if SHARED_PAGES:
+        SHARED.set(shared_key, page.encode("utf-8"), ttl=RESULT_SHARED_TTL)
+    return page
+
+register_cache("outcomes", _result_context.cache_stats)
+register_cache("pages", _result_page.cache_stats)
+
+@_quiz_route("/result")
+def result():
+    key = _progress_key()
+    if key not in session:
+        return redirect(url_for("home"))
+
+    quiz = g.quiz
+    with span("add_traits"):
+        traits = quiz.progress_traits(session[key])
+    return _result_page(_template_version("result.html"), quiz, quiz.trait_vector(traits))
+
+@_quiz_route("/reset")
 def reset():
-    session.clear()
+    _init_quiz()  # logs an unfinished run
+    session.pop(_progress_key())
     return redirect(url_for("home"))
 
+# FAST_START=1 does the per-process warm-up at import time. With gunicorn.conf.py
+# (preload_app) that is once, in the master: workers fork with compiled templates,
+# built quiz tables and rendered pages already in (shared, copy-on-write) memory.
+FAST_START = bool(os.environ.get("FAST_START"))
+
+if FAST_START:
+    precompile_templates()
+    for slug in QUIZZES:
+        QUIZZES.get(slug).warm()
+
+# PRERENDER_PAGES=1 renders the home and all question pages at startup (implied by FAST_START)
+if os.environ.get("PRERENDER_PAGES") or FAST_START:
+    prerender_pages()
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5001)
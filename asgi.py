@@ -0,0 +1,145 @@
+# asgi.py
+# ASGI entry point for the same app:
+#   gunicorn -k asgi -w 2 asgi:app
+# The event loop owns every connection. Static files (the multi-MB Michel videos and
+# images) are streamed from the loop in chunks, with Range support and write
+# backpressure, so a slow mobile client costs a suspended coroutine instead of a
+# whole worker. Page routes are the unchanged Flask views; they run on a small
+# thread pool (ASGI_THREADS) because sessions may touch sqlite.
+from __future__ import annotations
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from werkzeug.datastructures import Headers
+
+from app import app as flask_app
+from assets import CHUNK, plan_static
+
+STATIC_PREFIX = flask_app.static_url_path + "/"
+_POOL = ThreadPoolExecutor(int(os.environ.get("ASGI_THREADS", "8")), thread_name_prefix="asgi-wsgi")
+
+
+# -------------------------
+# Static files, on the loop
+# -------------------------
+async def _static(scope, send, asset, filename: str) -> None:
+    headers = Headers([(k.decode("latin-1"), v.decode("latin-1")) for k, v in scope["headers"]])
+    version = parse_qs(scope["query_string"].decode("latin-1")).get("v", [None])[0]
+    plan = plan_static(asset, os.path.join(flask_app.static_folder, filename), headers, version)
+
+    await send({
+        "type": "http.response.start",
+        "status": plan.status,
+        "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in plan.headers],
+    })
+    if scope["method"] == "HEAD" or plan.path is None:
+        await send({"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else plan.body})
+        return
+
+    loop = asyncio.get_running_loop()
+    fd = os.open(plan.path, os.O_RDONLY)
+    try:
+        offset, remaining = plan.start, plan.length
+        more_body = True
+        while remaining > 0:
+            # disk reads off the loop; send() waits while the client's buffer is full
+            data = await loop.run_in_executor(None, os.pread, fd, min(CHUNK, remaining), offset)
+            if not data:  # file shrank since the headers went out
+                break
+            offset += len(data)
+            remaining -= len(data)
+            more_body = remaining > 0
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+        if more_body:  # empty file, or cut short: the response still has to end
+            await send({"type": "http.response.body", "body": b""})
+    finally:
+        os.close(fd)
+
+
+# -------------------------
+# Everything else: the Flask app, on the thread pool
+# -------------------------
+def _environ(scope, body: bytes) -> dict:
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        key = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if key not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            key = "HTTP_" + key
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def _call_flask(environ: dict):
+    # -> (status, headers, body). Page bodies are small, so they're collected whole.
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [int(status.split(" ", 1)[0]),
+                      [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]]
+
+    result = flask_app(environ, start_response)
+    try:
+        body = b"".join(result)
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    return started[0], started[1], body
+
+
+async def _flask(scope, receive, send) -> None:
+    body = bytearray()
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            break
+    loop = asyncio.get_running_loop()
+    status, headers, data = await loop.run_in_executor(_POOL, _call_flask, _environ(scope, bytes(body)))
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": data})
+
+
+async def app(scope, receive, send) -> None:
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+
+    path = scope["path"]
+    if path.startswith(STATIC_PREFIX) and scope["method"] in ("GET", "HEAD"):
+        filename = path[len(STATIC_PREFIX):]
+        asset = flask_app.extensions["assets"].get(filename)
+        if asset is not None:
+            await _static(scope, send, asset, filename)
+            return
+    await _flask(scope, receive, send)
@@ -0,0 +1,184 @@
+# assets.py
+# Fingerprinted static files.
+# At startup every file under static/ is hashed; url_for('static', filename=...) then
+# adds ?v=<hash>, and a request carrying the current hash is served as immutable.
+# Text assets also get pre-built gzip (and brotli, if installed) bodies picked by Accept-Encoding.
+# Everything else is sent from the file itself, with Range support; under gunicorn the
+# bytes go out through wsgi.file_wrapper, i.e. sendfile().
+from __future__ import annotations
+import gzip
+import hashlib
+import mimetypes
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from flask import current_app, request
+from werkzeug.http import http_date, parse_accept_header, parse_date, parse_etags, parse_range_header, quote_etag, unquote_etag
+from werkzeug.utils import get_content_type
+from werkzeug.wsgi import wrap_file
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+CHUNK = 256 * 1024  # read size when a file can't be sent with sendfile()
+COMPRESSIBLE = {"text/css", "text/javascript", "application/javascript", "application/json",
+                "image/svg+xml", "text/plain", "text/html"}
+
+
+@dataclass(frozen=True)
+class Asset:
+    version: str          # short content hash, used in the URL
+    etag: str             # full content hash
+    mimetype: str
+    mtime: float
+    size: int = 0         # bytes on disk (the identity encoding)
+    encoded: Dict[str, bytes] = field(default_factory=dict)  # "br"/"gzip" -> body
+
+
+def hash_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _precompress(path: str) -> Dict[str, bytes]:
+    with open(path, "rb") as f:
+        raw = f.read()
+    out = {"gzip": gzip.compress(raw, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        out["br"] = brotli.compress(raw, quality=11)
+    # only worth it when it actually shrinks the file
+    return {enc: body for enc, body in out.items() if len(body) < len(raw)}
+
+
+def build_manifest(static_folder: str) -> Dict[str, Asset]:
+    manifest: Dict[str, Asset] = {}
+    for root, _, files in os.walk(static_folder):
+        for name in files:
+            if name.startswith("."):
+                continue
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, static_folder).replace(os.sep, "/")
+            digest = hash_file(path)
+            mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+            manifest[rel] = Asset(
+                version=digest[:12],
+                etag=digest,
+                mimetype=mimetype,
+                mtime=os.path.getmtime(path),
+                size=os.path.getsize(path),
+                encoded=_precompress(path) if mimetype in COMPRESSIBLE else {},
+            )
+    return manifest
+
+
+def _pick_encoding(asset: Asset, accept_encoding: Optional[str]):
+    accepted = parse_accept_header(accept_encoding)
+    for enc in ("br", "gzip"):
+        if enc in asset.encoded and accepted[enc]:
+            return enc
+    return None
+
+
+def _not_modified(headers, etag: str, mtime: float) -> bool:
+    if_none_match = headers.get("If-None-Match")
+    if if_none_match:
+        return parse_etags(if_none_match).contains_weak(etag)
+    since = parse_date(headers.get("If-Modified-Since"))
+    return since is not None and int(mtime) <= since.timestamp()
+
+
+@dataclass(frozen=True)
+class StaticPlan:
+    # A static response minus the I/O: shared by serve_static (WSGI) and asgi.py
+    status: int
+    headers: List[Tuple[str, str]]
+    body: bytes = b""           # pre-compressed body (or nothing)
+    path: Optional[str] = None  # file to send bytes [start, start + length) from
+    start: int = 0
+    length: int = 0
+
+
+def plan_static(asset: Asset, path: str, headers, version: Optional[str]) -> StaticPlan:
+    enc = _pick_encoding(asset, headers.get("Accept-Encoding"))
+    etag = f"{asset.etag}-{enc}" if enc else asset.etag
+    out = [
+        ("ETag", quote_etag(etag)),
+        ("Last-Modified", http_date(asset.mtime)),
+        # unversioned (or stale) URL: cacheable, but always revalidated via ETag
+        ("Cache-Control", IMMUTABLE if version == asset.version else "no-cache"),
+    ]
+    if asset.encoded:
+        out.append(("Vary", "Accept-Encoding"))
+    if _not_modified(headers, etag, asset.mtime):
+        return StaticPlan(304, out)
+
+    out.append(("Content-Type", get_content_type(asset.mimetype, "utf-8")))
+    if enc:
+        body = asset.encoded[enc]
+        return StaticPlan(200, out + [("Content-Encoding", enc), ("Content-Length", str(len(body)))], body)
+
+    size = os.path.getsize(path)
+    out.append(("Accept-Ranges", "bytes"))
+    # A single byte range (video seeking, resumed downloads); If-Range must match the current ETag
+    rng = parse_range_header(headers.get("Range"))
+    if rng is not None and (len(rng.ranges) != 1 or unquote_etag(headers.get("If-Range", quote_etag(etag)))[0] != etag):
+        rng = None
+    if rng is None:
+        return StaticPlan(200, out + [("Content-Length", str(size))], path=path, length=size)
+    span = rng.range_for_length(size)
+    if span is None:
+        return StaticPlan(416, out + [("Content-Range", f"bytes */{size}"), ("Content-Length", "0")])
+    start, stop = span
+    out += [("Content-Range", f"bytes {start}-{stop - 1}/{size}"), ("Content-Length", str(stop - start))]
+    return StaticPlan(206, out, path=path, start=start, length=stop - start)
+
+
+def _read_span(f, length: int):
+    with f:
+        while length > 0:
+            data = f.read(min(CHUNK, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def serve_static(filename: str):
+    asset = current_app.extensions["assets"].get(filename)
+    if asset is None:
+        # not known at startup (e.g. added later): plain Flask behaviour
+        return current_app.send_static_file(filename)
+
+    plan = plan_static(asset, os.path.join(current_app.static_folder, filename), request.headers, request.args.get("v"))
+    if plan.path is None:
+        return current_app.response_class(plan.body, plan.status, plan.headers)
+
+    f = open(plan.path, "rb")
+    f.seek(plan.start)
+    if "wsgi.file_wrapper" in request.environ:
+        # gunicorn sendfile()s from the current offset, capped at Content-Length
+        body = wrap_file(request.environ, f)
+    else:
+        body = _read_span(f, plan.length)
+    return current_app.response_class(body, plan.status, plan.headers, direct_passthrough=True)
+
+
+def init_assets(app) -> None:
+    manifest = build_manifest(app.static_folder)
+    app.extensions["assets"] = manifest
+
+    @app.url_defaults
+    def _version_static_urls(endpoint, values):
+        if endpoint == "static" and "v" not in values:
+            asset = manifest.get(values.get("filename", ""))
+            if asset is not None:
+                values["v"] = asset.version
+
+    app.view_functions["static"] = serve_static
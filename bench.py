@@ -0,0 +1,563 @@
+# bench.py
+# Offline benchmarks.
+#   python bench.py rank [--sizes 1,1000,1000000]
+#   python bench.py sessions [--workers 1,4,16]   (needs gunicorn)
+#   python bench.py flow [--gunicorn 4] [--json out.json]
+#   python bench.py micro [--json out.json]
+#   python bench.py slow [--slow 0,4,16,64]       (sync vs gthread vs asgi workers)
+#   python bench.py nodes [--nodes 1,2,4]         (several app nodes, with / without SHARED_STORE)
+#   python bench.py startup [--workers 4]         (time to first response per worker, with / without FAST_START)
+from __future__ import annotations
+import argparse
+import http.cookiejar
+import json
+import os
+import queue
+import random
+import re
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import timeit
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from typing import Dict, List
+
+from michel_quiz import (
+    QUIZ, QUIZ_DIR, QUESTIONS, MICHELS, load_quiz, add_traits, michel_score, rank_michels, rank_many, rank_matrix,
+    pick_punchlines, pick_punchlines_many, sample_traits, START, record_answer,
+)
+
+
+def _rank_reference(user_traits: Dict[str, int]):
+    # The original per-request path: dict loops + _norm(profile) for every Michel
+    scored = [(m, michel_score(user_traits, m)) for m in MICHELS]
+    scored.sort(key=lambda x: x[1], reverse=True)
+    return scored
+
+
+def _timed(fn) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def bench_rank(sizes: List[int], baseline_max: int) -> None:
+    print(f"{'users':>10} {'reference':>12} {'rank_michels':>14} {'rank_many':>12} {'rank_matrix':>12} {'speedup':>9}")
+    for n in sizes:
+        sessions = sample_traits(n)
+        ref = _timed(lambda: [_rank_reference(u) for u in sessions]) if n <= baseline_max else None
+        single = _timed(lambda: [rank_michels(u) for u in sessions])
+        batch = _timed(lambda: rank_many(sessions))
+        try:
+            # the archive path: rows already in trait order (as stored), winners + scores as arrays
+            rows = [QUIZ.trait_vector(u) for u in sessions]
+            matrix = _timed(lambda: rank_matrix(rows))
+        except ImportError:
+            matrix = None
+        fastest = min(batch, matrix) if matrix is not None else batch
+        ref_s = f"{ref:.4f}s" if ref is not None else "-"
+        matrix_s = f"{matrix:.4f}s" if matrix is not None else "no numpy"
+        speedup = f"{ref / fastest:.1f}x" if ref is not None else "-"
+        print(f"{n:>10} {ref_s:>12} {single:>13.4f}s {batch:>11.4f}s {matrix_s:>12} {speedup:>9}")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for(url: str, timeout: float = 15) -> None:
+    deadline = time.time() + timeout
+    while True:
+        try:
+            urllib.request.urlopen(url).read()
+            return
+        except OSError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def start_gunicorn(workers: int, env: Dict[str, str], extra_args: List[str] = (), app_path: str = "app:app"):
+    port = _free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-w", str(workers), "-b", f"127.0.0.1:{port}",
+         "--log-level", "warning", *extra_args, app_path],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env={**os.environ, **env},
+    )
+    base = f"http://127.0.0.1:{port}"
+    _wait_for(base + "/")
+    return proc, base
+
+
+def run_quiz(base, rng: random.Random) -> int:
+    # One full run through a cookie-keeping client; returns the number of requests sent,
+    # or -1 if the session got lost along the way (no result at the end).
+    # base may be a list of nodes: requests then go round-robin, like a non-sticky load balancer.
+    bases = [base] if isinstance(base, str) else base
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    opener.open(bases[0] + "/", data=b"").read()
+    for i in range(1, 17):
+        opener.open(bases[i % len(bases)] + "/question", data=("option=" + rng.choice("ABCD")).encode()).read()
+    page = opener.open(bases[17 % len(bases)] + "/result").read()
+    return 18 if b"You are:" in page else -1
+
+
+def _drive(base: str, clients: int, duration: float):
+    done, lost, reqs = [0], [0], [0]
+    lock = threading.Lock()
+    deadline = time.time() + duration
+
+    def client(seed):
+        rng = random.Random(seed)
+        while time.time() < deadline:
+            n = run_quiz(base, rng)
+            with lock:
+                if n < 0:
+                    lost[0] += 1
+                else:
+                    done[0] += 1
+                    reqs[0] += n
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return done[0], lost[0], reqs[0]
+
+
+def bench_sessions(workers: List[int], clients: int, duration: float) -> None:
+    print(f"{'backend':>8} {'workers':>8} {'req/s':>9} {'quizzes':>8} {'lost':>6}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in ("cookie", "sqlite"):
+            for w in workers:
+                env = {"SESSION_BACKEND": backend,
+                       "SESSION_DB": os.path.join(tmp, f"sessions-{w}.db")}
+                proc, base = start_gunicorn(w, env)
+                try:
+                    done, lost, reqs = _drive(base, clients, duration)
+                finally:
+                    proc.terminate()
+                    proc.wait()
+                print(f"{backend:>8} {w:>8} {reqs / duration:>9.0f} {done:>8} {lost:>6}")
+
+
+# -------------------------
+# Startup: how long a fresh worker takes to answer, at boot and after a HUP
+# (every worker respawned, as after a deploy), with and without FAST_START.
+# The numbers come from the post_request hook in gunicorn.conf.py.
+# -------------------------
+_FIRST_RESPONSE = re.compile(r"worker (\d+): app ready (\d+) ms, first response (\d+) ms after fork")
+
+
+def _first_responses(base: str, workers: int, reports: "queue.Queue", timeout: float = 30) -> List[int]:
+    # Keeps every worker busy with home page requests until each has reported
+    # -> first response times (ms after fork), one per worker
+    seen: Dict[int, int] = {}
+    stop = threading.Event()
+
+    def poke():
+        while not stop.is_set():
+            try:
+                urllib.request.urlopen(base + "/").read()
+            except OSError:
+                time.sleep(0.01)
+
+    threads = [threading.Thread(target=poke, daemon=True) for _ in range(workers)]
+    for t in threads:
+        t.start()
+    deadline = time.time() + timeout
+    try:
+        while len(seen) < workers and time.time() < deadline:
+            try:
+                pid, first = reports.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            seen[pid] = first
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+    return sorted(seen.values())
+
+
+def bench_startup(workers: int) -> None:
+    here = os.path.dirname(os.path.abspath(__file__))
+    print(f"{'mode':>10} {'boot':>8}   first response per worker, ms after fork (boot | after HUP)")
+    for fast in (False, True):
+        port = _free_port()
+        base = f"http://127.0.0.1:{port}"
+        t0 = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-w", str(workers), "-b", f"127.0.0.1:{port}",
+             "--log-level", "info", "app:app"],
+            cwd=here, env={**os.environ, "FAST_START": "1" if fast else ""},
+            stderr=subprocess.PIPE, text=True,
+        )
+        reports: "queue.Queue" = queue.Queue()
+
+        def read_log():
+            for line in proc.stderr:
+                m = _FIRST_RESPONSE.search(line)
+                if m:
+                    reports.put((int(m.group(1)), int(m.group(3))))
+
+        threading.Thread(target=read_log, daemon=True).start()
+        try:
+            _wait_for(base + "/")
+            boot = time.perf_counter() - t0
+            at_boot = _first_responses(base, workers, reports)
+            proc.send_signal(signal.SIGHUP)
+            after_hup = _first_responses(base, workers, reports)
+        finally:
+            proc.terminate()
+            proc.wait()
+        label = "fast" if fast else "default"
+        print(f"{label:>10} {boot:>7.2f}s   {' '.join(map(str, at_boot))} | {' '.join(map(str, after_hup))}")
+
+
+# -------------------------
+# Nodes: N single-worker app nodes with their own instance folders (so no shared key
+# file), behind a round-robin client. Without a shared store every node signs with
+# its own key and runs get lost; with one they share the key and rendered results.
+# -------------------------
+def bench_nodes(node_counts: List[int], clients: int, duration: float) -> None:
+    here = os.path.dirname(os.path.abspath(__file__))
+    print(f"{'store':>8} {'nodes':>6} {'req/s':>9} {'quizzes':>8} {'lost':>6}")
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        address = os.path.join(tmp, "store.sock")
+        server = subprocess.Popen([sys.executable, os.path.join(here, "store.py"), "serve", address],
+                                  stdout=subprocess.DEVNULL)
+        try:
+            deadline = time.time() + 10
+            while not os.path.exists(address):
+                if time.time() > deadline:
+                    raise RuntimeError("store server did not start")
+                time.sleep(0.05)
+            for shared in (False, True):
+                for n in node_counts:
+                    env = {"SHARED_STORE": address} if shared else {}
+                    nodes = [start_gunicorn(1, {**env, "INSTANCE_PATH": os.path.join(tmp, f"{shared}-{n}-{i}")})
+                             for i in range(n)]
+                    try:
+                        done, lost, reqs = _drive([base for _, base in nodes], clients, duration)
+                    finally:
+                        for proc, _ in nodes:
+                            proc.terminate()
+                            proc.wait()
+                    label = "socket" if shared else "none"
+                    print(f"{label:>8} {n:>6} {reqs / duration:>9.0f} {done:>8} {lost:>6}")
+                    if shared and lost:
+                        failed = True
+        finally:
+            server.terminate()
+            server.wait()
+    if failed:
+        raise SystemExit("runs lost with a shared store")
+
+
+# -------------------------
+# Slow clients: N connections trickle-download the biggest media file while a
+# probe keeps loading the home page, all against ONE worker.
+# -------------------------
+SERVING_MODES = {
+    "sync": ([], "app:app"),
+    "gthread": (["-k", "gthread", "--threads", "8"], "app:app"),
+    "asgi": (["-k", "asgi"], "asgi:app"),
+}
+
+
+def _slow_download(port: int, path: str, stop: threading.Event, received: List[int]) -> None:
+    # ~400 KB/s: a small receive window, read 4 KB every 10 ms
+    s = socket.socket()
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    s.connect(("127.0.0.1", port))
+    s.sendall(f"GET /static/{path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+    try:
+        while not stop.is_set():
+            data = s.recv(4096)
+            if not data:
+                break
+            received[0] += len(data)
+            time.sleep(0.01)
+    except OSError:  # server stopped under us
+        pass
+    finally:
+        s.close()
+
+
+def bench_slow(slow_counts: List[int], duration: float, probe_timeout: float = 2.0) -> None:
+    pics = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "pics")
+    biggest = max(os.listdir(pics), key=lambda n: os.path.getsize(os.path.join(pics, n)))
+    print(f"slow clients download pics/{biggest}; probe = GET / (timeout {probe_timeout:.0f}s), 1 worker\n")
+    print(f"{'mode':>8} {'slow':>5} {'probes':>7} {'timeouts':>9} {'p50 ms':>8} {'p99 ms':>8} {'slow MB/s':>10}")
+    for mode, (extra_args, app_path) in SERVING_MODES.items():
+        for n in slow_counts:
+            proc, base = start_gunicorn(1, {}, extra_args, app_path)
+            port = int(base.rsplit(":", 1)[1])
+            stop, received = threading.Event(), [0]
+            slow = [threading.Thread(target=_slow_download, args=(port, f"pics/{biggest}", stop, received), daemon=True)
+                    for _ in range(n)]
+            try:
+                for t in slow:
+                    t.start()
+                time.sleep(0.5)  # let every download get going
+                latencies, timeouts = [], 0
+                deadline = time.time() + duration
+                while time.time() < deadline:
+                    t0 = time.perf_counter()
+                    try:
+                        urllib.request.urlopen(base + "/", timeout=probe_timeout).read()
+                        latencies.append(time.perf_counter() - t0)
+                    except OSError:
+                        timeouts += 1
+                stop.set()
+            finally:
+                proc.terminate()
+                proc.wait()
+            latencies.sort()
+            p50 = f"{1000 * _percentile(latencies, 50):.1f}" if latencies else "-"
+            p99 = f"{1000 * _percentile(latencies, 99):.1f}" if latencies else "-"
+            mb_s = received[0] / (duration + 0.5) / 1e6
+            print(f"{mode:>8} {n:>5} {len(latencies):>7} {timeouts:>9} {p50:>8} {p99:>8} {mb_s:>10.2f}")
+
+
+# -------------------------
+# Full quiz flow: POST / -> 16 x (GET + POST /question) -> GET /result
+# -------------------------
+class _TestClientDriver:
+    def __init__(self):
+        from app import app
+        self.client = app.test_client()
+
+    def request(self, method: str, path: str, data=None) -> int:
+        return self.client.open(path, method=method, data=data).status_code
+
+    def cookie_bytes(self) -> int:
+        cookie = self.client.get_cookie("session")
+        return len(cookie.value) if cookie else 0
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None  # surface the 302 itself, the flow issues the next request
+
+
+class _HttpDriver:
+    def __init__(self, base: str):
+        self.base = base
+        self.jar = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.jar), _NoRedirect)
+
+    def request(self, method: str, path: str, data=None) -> int:
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base + path, data=body, method=method)
+        try:
+            with self.opener.open(req) as resp:
+                resp.read()
+                return resp.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+    def cookie_bytes(self) -> int:
+        return sum(len(c.value) for c in self.jar if c.name == "session")
+
+
+def _one_flow(driver, rng: random.Random, latencies, cookie_sizes: List[int], prefix: str = "",
+              n_questions: int = len(QUESTIONS)) -> None:
+    steps = [("POST", f"{prefix}/", {})]
+    for _ in range(n_questions):
+        steps += [("GET", f"{prefix}/question", None), ("POST", f"{prefix}/question", {"option": rng.choice("ABCD")})]
+    steps.append(("GET", f"{prefix}/result", None))
+    for i, (method, path, data) in enumerate(steps):
+        t0 = time.perf_counter()
+        status = driver.request(method, path, data)
+        latencies[f"{method} {path}"].append(time.perf_counter() - t0)
+        if status >= 400:
+            raise RuntimeError(f"{method} {path} -> {status}")
+        if len(cookie_sizes) <= i:
+            cookie_sizes.append(driver.cookie_bytes())
+
+
+def _percentile(sorted_values: List[float], p: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(p / 100 * len(sorted_values)))]
+
+
+def bench_flow(quizzes: int, clients: int, gunicorn_workers: int, quiz_slug: str = "") -> dict:
+    # quiz_slug: run /<slug>/... instead of the default quiz's bare URLs
+    prefix, n_questions = "", len(QUESTIONS)
+    if quiz_slug:
+        prefix = f"/{quiz_slug}"
+        n_questions = len(load_quiz(os.path.join(QUIZ_DIR, f"{quiz_slug}.json")).questions)
+    latencies = defaultdict(list)
+    cookie_sizes: List[int] = []
+    proc = None
+    if gunicorn_workers:
+        proc, base = start_gunicorn(gunicorn_workers, {})
+        make_driver = lambda: _HttpDriver(base)
+    else:
+        make_driver = _TestClientDriver
+    lock = threading.Lock()
+
+    def client(seed):
+        rng = random.Random(seed)
+        local = defaultdict(list)
+        # cookie sizes come from client 0's first run only: the list is not shared between threads
+        sizes = cookie_sizes if seed == 0 else []
+        for _ in range(quizzes):
+            _one_flow(make_driver(), rng, local, sizes, prefix, n_questions)
+        with lock:
+            for route, values in local.items():
+                latencies[route].extend(values)
+
+    try:
+        t0 = time.perf_counter()
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - t0
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+    routes = {}
+    for route, values in sorted(latencies.items()):
+        values.sort()
+        routes[route] = {
+            "count": len(values),
+            "p50_ms": 1000 * _percentile(values, 50),
+            "p95_ms": 1000 * _percentile(values, 95),
+            "p99_ms": 1000 * _percentile(values, 99),
+            "rps": len(values) / wall,
+        }
+    total = sum(r["count"] for r in routes.values())
+    return {
+        "target": f"gunicorn -w {gunicorn_workers}" if gunicorn_workers else "test_client",
+        "clients": clients,
+        "quizzes": quizzes * clients,
+        "wall_s": wall,
+        "rps": total / wall,
+        "routes": routes,
+        "cookie_bytes_per_step": cookie_sizes,
+    }
+
+
+def print_flow(report: dict) -> None:
+    print(f"{report['target']}: {report['quizzes']} quizzes, {report['clients']} clients, "
+          f"{report['rps']:.0f} req/s overall")
+    print(f"{'route':<24} {'count':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8}")
+    for route, r in report["routes"].items():
+        print(f"{route:<24} {r['count']:>7} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['rps']:>8.0f}")
+    print("cookie bytes per step:", " ".join(map(str, report["cookie_bytes_per_step"])))
+
+
+# -------------------------
+# Micro-benchmarks
+# -------------------------
+def bench_micro(number: int) -> dict:
+    traits = sample_traits(256, seed=1)
+    deltas = [o.delta for q in QUESTIONS for o in q.options]
+    winners = [rank_michels(t)[0][0].id for t in traits]
+    rng = random.Random(1)
+    states = []
+    for _ in traits:
+        progress = START
+        for q in QUESTIONS:
+            progress = record_answer(progress, rng.randrange(len(q.options)))
+        states.append(QUIZ.progress_state(progress))
+    cases = {
+        "add_traits": lambda: [add_traits(t, d) for t, d in zip(traits, deltas * 4)],
+        "rank_michels": lambda: [rank_michels(t) for t in traits],
+        "pick_punchlines": lambda: [pick_punchlines(w, t) for w, t in zip(winners, traits)],
+        "pick_punchlines_many": lambda: pick_punchlines_many(zip(winners, traits)),
+        # the per-answer path on /question: one incremental update + the leader from running dots
+        "add_answer": lambda: [QUIZ.add_answer(s, 3, 1) for s in states],
+        "leader": lambda: [QUIZ.leader(s) for s in states],
+    }
+    out = {}
+    for name, fn in cases.items():
+        best = min(timeit.repeat(fn, number=number, repeat=5))
+        out[name] = {"ns_per_call": 1e9 * best / (number * len(traits))}
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Michel quiz benchmarks")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("rank", help="rank_michels / rank_many vs the dict-based reference")
+    p.add_argument("--sizes", default="1,1000,1000000")
+    p.add_argument("--baseline-max", type=int, default=100_000,
+                   help="skip the (slow) reference path above this many users")
+
+    p = sub.add_parser("sessions", help="cookie vs sqlite sessions under gunicorn")
+    p.add_argument("--workers", default="1,4,16")
+    p.add_argument("--clients", type=int, default=16)
+    p.add_argument("--duration", type=float, default=5.0)
+
+    p = sub.add_parser("flow", help="full quiz flow latency / throughput / cookie size")
+    p.add_argument("--quizzes", type=int, default=50, help="quizzes per client")
+    p.add_argument("--clients", type=int, default=1)
+    p.add_argument("--gunicorn", type=int, default=0, metavar="WORKERS",
+                   help="run against a local gunicorn with this many workers instead of the test client")
+    p.add_argument("--quiz", default="", help="quiz slug to run (default: the bare-URL default quiz)")
+    p.add_argument("--json", help="also write the results to this file")
+
+    p = sub.add_parser("nodes", help="round-robin over several app nodes, with / without a shared store")
+    p.add_argument("--nodes", default="1,2,4")
+    p.add_argument("--clients", type=int, default=8)
+    p.add_argument("--duration", type=float, default=5.0)
+
+    p = sub.add_parser("startup", help="time to first response per worker, with / without FAST_START")
+    p.add_argument("--workers", type=int, default=4)
+
+    p = sub.add_parser("slow", help="page latency while slow clients download media, per worker type")
+    p.add_argument("--slow", default="0,4,16,64", help="concurrent slow downloads")
+    p.add_argument("--duration", type=float, default=5.0)
+
+    p = sub.add_parser("micro", help="add_traits / rank_michels / pick_punchlines / add_answer / leader")
+    p.add_argument("--number", type=int, default=20)
+    p.add_argument("--json", help="also write the results to this file")
+
+    args = parser.parse_args()
+    report = None
+    if args.cmd == "rank":
+        bench_rank([int(s) for s in args.sizes.split(",")], args.baseline_max)
+    elif args.cmd == "sessions":
+        bench_sessions([int(w) for w in args.workers.split(",")], args.clients, args.duration)
+    elif args.cmd == "flow":
+        report = bench_flow(args.quizzes, args.clients, args.gunicorn, args.quiz)
+        print_flow(report)
+    elif args.cmd == "nodes":
+        bench_nodes([int(n) for n in args.nodes.split(",")], args.clients, args.duration)
+    elif args.cmd == "startup":
+        bench_startup(args.workers)
+    elif args.cmd == "slow":
+        bench_slow([int(n) for n in args.slow.split(",")], args.duration)
+    elif args.cmd == "micro":
+        report = bench_micro(args.number)
+        for name, r in report.items():
+            print(f"{name:<22} {r['ns_per_call']:>10.0f} ns/call")
+
+    if report is not None and args.json:
+        with open(args.json, "w") as f:
+            json.dump({"bench": args.cmd, "python": sys.version.split()[0], "results": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+# gunicorn.conf.py
+# Read by gunicorn when started from this directory (gunicorn app:app, or
+# gunicorn -k asgi asgi:app); command-line flags still win.
+#
+# FAST_START=1 preloads the app in the master (see the end of app.py): imports,
+# template compilation and quiz tables happen once, and every worker (including
+# ones respawned after HUP / max_requests or added with TTIN) forks ready to serve.
+import gc
+import os
+import time
+
+preload_app = bool(os.environ.get("FAST_START"))
+
+
+def when_ready(server):
+    # Runs before the first fork. What the master loaded lives as long as it does:
+    # keep it out of the GC so collections in the workers don't un-share its pages.
+    if server.cfg.preload_app:
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    worker.forked_at = time.perf_counter()
+
+
+def post_worker_init(worker):
+    worker.ready_after = time.perf_counter() - worker.forked_at
+
+
+def post_request(worker, req, environ, resp):
+    # One line per worker: how long after fork it answered its first request
+    if not hasattr(worker, "first_response_after"):
+        worker.first_response_after = time.perf_counter() - worker.forked_at
+        worker.log.info("worker %s: app ready %.0f ms, first response %.0f ms after fork",
+                        worker.pid, worker.ready_after * 1000, worker.first_response_after * 1000)
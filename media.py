@@ -0,0 +1,208 @@
+# media.py
+# Build-time media pipeline for static/pics:
+#   python media.py build
+# - images: resized AVIF + WebP variants (srcset candidates)
+# - videos: a poster frame (needs ffmpeg on PATH)
+# - static/media_manifest.json: original path -> variants, read by the app at startup
+# At runtime, build_index() checks every Michel.media once and resolves broken paths.
+# Needs Pillow (with AVIF support for the .avif variants) at build time only.
+from __future__ import annotations
+import argparse
+import json
+import mimetypes
+import os
+import shutil
+import subprocess
+import sys
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from assets import hash_file
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+DERIVED_DIR = "pics/derived"  # relative to STATIC_DIR, like Michel.media
+MANIFEST_PATH = os.path.join(STATIC_DIR, "media_manifest.json")
+
+WIDTHS = [480, 960, 1440]
+FORMATS = [("avif", "image/avif", 50), ("webp", "image/webp", 78)]  # (ext, mime, quality)
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png"}
+VIDEO_EXTS = {".mp4", ".webm", ".mov"}
+
+
+# -------------------------
+# Runtime lookup
+# -------------------------
+def load_manifest(path: str = MANIFEST_PATH) -> Dict[str, dict]:
+    # Missing manifest == no variants: templates fall back to the original file
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+@dataclass(frozen=True)
+class MediaFile:
+    requested: str          # Michel.media as written
+    path: Optional[str]     # file actually served (relative to static/), None if nothing usable
+    mimetype: str = ""
+    sha256: str = ""
+    problem: Optional[str] = None
+    size: int = 0           # bytes, 0 if nothing usable
+
+    @property
+    def kind(self) -> str:
+        return self.mimetype.split("/")[0]  # "image" / "video"
+
+
+def _resolve(rel: str, available: List[str]):
+    # -> (path, problem). Tries: exact, other case, other extension, numbered variant (foo_1.jpg)
+    if rel in available:
+        return rel, None
+    lower = {p.lower(): p for p in available}
+    if rel.lower() in lower:
+        return lower[rel.lower()], "case mismatch"
+    stem = os.path.splitext(rel)[0].lower()
+    same_stem = sorted(p for p in available if os.path.splitext(p)[0].lower() == stem)
+    if same_stem:
+        return same_stem[0], "extension mismatch"
+    numbered = sorted(p for p in available if os.path.splitext(p)[0].lower().startswith(stem + "_"))
+    if numbered:
+        return numbered[0], "missing, using a variant"
+    return None, "missing"
+
+
+def build_index(michels, static_dir: str = STATIC_DIR, assets=None) -> Dict[int, MediaFile]:
+    # Michel.id -> MediaFile, built once at startup so a broken path never costs a 404 at request time.
+    # assets: the static manifest (assets.build_manifest), whose hashes are reused instead of re-reading
+    # the files; only files it doesn't know (added since startup) get hashed here.
+    dirs = {os.path.dirname(m.media) for m in michels}
+    available = [
+        f"{d}/{name}" for d in dirs if os.path.isdir(os.path.join(static_dir, d))
+        for name in os.listdir(os.path.join(static_dir, d)) if not name.startswith(".")
+    ]
+    index: Dict[int, MediaFile] = {}
+    for m in michels:
+        path, problem = _resolve(m.media, available)
+        if path is None:
+            index[m.id] = MediaFile(m.media, None, problem=problem)
+            continue
+        asset = assets.get(path) if assets else None
+        if asset is not None:
+            mimetype, sha256, size = asset.mimetype, asset.etag, asset.size
+        else:
+            mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+            sha256 = hash_file(os.path.join(static_dir, path))
+            size = os.path.getsize(os.path.join(static_dir, path))
+        if not mimetype.startswith(m.media_type + "/"):
+            problem = f"media_type is {m.media_type} but file is {mimetype}"
+        index[m.id] = MediaFile(m.media, path, mimetype, sha256, problem, size)
+    return index
+
+
+# -------------------------
+# Build
+# -------------------------
+def _build_image(rel: str) -> dict:
+    from PIL import Image, ImageOps
+
+    src = os.path.join(STATIC_DIR, rel)
+    stem = os.path.splitext(os.path.basename(rel))[0]
+    with Image.open(src) as im:
+        im = ImageOps.exif_transpose(im).convert("RGB")
+        entry = {"width": im.width, "height": im.height, "sources": []}
+        # never upscale; always emit at least one (original-width) variant
+        widths = [w for w in WIDTHS if w < im.width] + [min(im.width, WIDTHS[-1])]
+        for ext, mime, quality in FORMATS:
+            variants = []
+            for w in sorted(set(widths)):
+                out_rel = f"{DERIVED_DIR}/{stem}-{w}.{ext}"
+                resized = im if w == im.width else im.resize((w, round(im.height * w / im.width)), Image.LANCZOS)
+                try:
+                    resized.save(os.path.join(STATIC_DIR, out_rel), quality=quality)
+                except (KeyError, OSError) as e:  # Pillow built without this encoder
+                    print(f"  skip {ext}: {e}", file=sys.stderr)
+                    variants = []
+                    break
+                variants.append([out_rel, w])
+            if variants:
+                entry["sources"].append({"type": mime, "srcset": variants})
+    return entry
+
+
+def _build_video(rel: str) -> dict:
+    entry: dict = {}
+    if not shutil.which("ffmpeg"):
+        print(f"  ffmpeg not found, no poster for {rel}", file=sys.stderr)
+        return entry
+    stem = os.path.splitext(os.path.basename(rel))[0]
+    out_rel = f"{DERIVED_DIR}/{stem}-poster.jpg"
+    subprocess.run(
+        ["ffmpeg", "-y", "-loglevel", "error", "-ss", "0.5", "-i", os.path.join(STATIC_DIR, rel),
+         "-frames:v", "1", "-vf", f"scale='min({WIDTHS[1]},iw)':-2", "-q:v", "4",
+         os.path.join(STATIC_DIR, out_rel)],
+        check=True,
+    )
+    entry["poster"] = out_rel
+    return entry
+
+
+def _smallest_desktop_bytes(entry: dict) -> Optional[int]:
+    # What a typical desktop browser downloads: the 960w (or largest <= 960) variant, best format
+    best = None
+    for source in entry.get("sources", []):
+        candidates = [p for p, w in source["srcset"] if w <= WIDTHS[1]] or [source["srcset"][0][0]]
+        size = os.path.getsize(os.path.join(STATIC_DIR, candidates[-1]))
+        best = size if best is None else min(best, size)
+    return best
+
+
+def build() -> Dict[str, dict]:
+    from michel_quiz import MICHELS
+
+    os.makedirs(os.path.join(STATIC_DIR, DERIVED_DIR), exist_ok=True)
+    manifest: Dict[str, dict] = {}
+    pics = os.path.join(STATIC_DIR, "pics")
+    for name in sorted(os.listdir(pics)):
+        rel = f"pics/{name}"
+        ext = os.path.splitext(name)[1].lower()
+        if ext in IMAGE_EXTS:
+            print(f"image {rel}")
+            manifest[rel] = _build_image(rel)
+        elif ext in VIDEO_EXTS:
+            print(f"video {rel}")
+            manifest[rel] = _build_video(rel)
+
+    tmp = MANIFEST_PATH + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, MANIFEST_PATH)
+
+    index = build_index(MICHELS)
+    print(f"\n{'Michel':<26} {'original':>10} {'served':>10} {'saved':>7}")
+    for m in MICHELS:
+        f = index[m.id]
+        if f.path not in manifest:
+            print(f"{m.name:<26} {'missing':>10}")
+            continue
+        original = f.size
+        served = _smallest_desktop_bytes(manifest[f.path])
+        if served is None:  # videos: the poster is extra, preload=metadata is the saving
+            print(f"{m.name:<26} {original:>10} {'-':>10} {'-':>7}")
+        else:
+            print(f"{m.name:<26} {original:>10} {served:>10} {100 * (1 - served / original):>6.1f}%")
+    return manifest
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Responsive variants for static/pics")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("build")
+    args = parser.parse_args()
+    if args.cmd == "build":
+        build()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+# metrics.py
+# In-process request / span timings and cache counters, exposed in Prometheus text format on /metrics.
+# Every thread writes to its own histogram shard (no locks on the request path);
+# shards are only summed when /metrics is scraped. Numbers are per worker process,
+# labelled with the pid.
+#
+# Access: loopback clients, or any client sending "Authorization: Bearer $METRICS_TOKEN".
+# Behind a reverse proxy on the same host every request comes from 127.0.0.1, so
+# there the loopback check lets everyone in: set METRICS_TOKEN, or don't route
+# /metrics through the proxy. Starting / stopping the profiler always needs the
+# token (POST /metrics/profile?enable=1|0); without METRICS_TOKEN it can't be toggled.
+from __future__ import annotations
+import hmac
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Dict, List
+
+from flask import Response, abort, g, request
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+BYTES_BUCKETS = (32, 64, 128, 256, 512, 1024, 2048, 4096)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, label: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = buckets
+        self._local = threading.local()
+        self._shards: List[Dict[str, list]] = []
+
+    def observe(self, label_value: str, value: float) -> None:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            self._shards.append(shard)  # list.append is atomic
+        row = shard.get(label_value)
+        if row is None:
+            row = shard[label_value] = [0] * (len(self.buckets) + 1) + [0.0]  # buckets, +Inf, sum
+        row[bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    def expose(self, pid: int) -> List[str]:
+        totals: Dict[str, list] = {}
+        for shard in list(self._shards):
+            for label_value, row in list(shard.items()):
+                acc = totals.setdefault(label_value, [0] * len(row))
+                for i, v in enumerate(row):
+                    acc[i] += v
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_value, row in sorted(totals.items()):
+            labels = f'{self.label}="{label_value}",pid="{pid}"'
+            cumulative = 0
+            for le, count in zip(self.buckets + ("+Inf",), row[:-1]):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {row[-1]}")
+            lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram("michel_request_seconds", "Request latency per route", "route")
+SPAN_SECONDS = Histogram("michel_span_seconds", "Time spent in hot-path steps", "span")
+COOKIE_BYTES = Histogram("michel_session_cookie_bytes", "Size of the incoming session cookie", "route",
+                         BYTES_BUCKETS)
+HISTOGRAMS = [REQUEST_SECONDS, SPAN_SECONDS, COOKIE_BYTES]
+
+# name -> cache_stats() of a cache whose hits / misses / evictions / size go on /metrics
+CACHES: Dict[str, Callable[[], dict]] = {}
+
+
+def register_cache(name: str, stats: Callable[[], dict]) -> None:
+    CACHES[name] = stats
+
+
+def expose_caches(pid: int) -> List[str]:
+    stats = {name: fn() for name, fn in sorted(CACHES.items())}
+    lines = []
+    for key, kind, help in (("hits", "counter", "Cache hits"), ("misses", "counter", "Cache misses"),
+                            ("evictions", "counter", "Entries evicted to stay within maxsize"),
+                            ("size", "gauge", "Entries in the cache"), ("maxsize", "gauge", "Cache capacity")):
+        name = f"michel_cache_{key}_total" if kind == "counter" else f"michel_cache_{key}"
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+        lines += [f'{name}{{cache="{cache}",pid="{pid}"}} {s[key]}' for cache, s in stats.items()]
+    return lines
+
+
+@contextmanager
+def span(name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        SPAN_SECONDS.observe(name, time.perf_counter() - t0)
+
+
+# -------------------------
+# Sampling profiler (off unless started with POST /metrics/profile?enable=1)
+# -------------------------
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < 32:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                self.samples[";".join(reversed(stack))] += 1
+
+    def report(self, top: int = 50) -> str:
+        # collapsed-stack format (flamegraph.pl / speedscope)
+        return "\n".join(f"{stack} {n}" for stack, n in self.samples.most_common(top)) + "\n"
+
+
+PROFILER = SamplingProfiler()
+
+
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+
+def _has_token() -> bool:
+    auth = request.headers.get("Authorization", "")
+    return bool(METRICS_TOKEN) and hmac.compare_digest(auth.encode(), f"Bearer {METRICS_TOKEN}".encode())
+
+
+def _metrics_access() -> None:
+    if not _has_token() and request.remote_addr not in ("127.0.0.1", "::1"):
+        abort(404)
+
+
+def init_metrics(app) -> None:
+    session_open = app.session_interface.open_session
+    session_save = app.session_interface.save_session
+
+    def open_session(app_, request_):
+        with span("session_load"):
+            return session_open(app_, request_)
+
+    def save_session(app_, session, response):
+        with span("session_save"):
+            return session_save(app_, session, response)
+
+    app.session_interface.open_session = open_session
+    app.session_interface.save_session = save_session
+
+    @app.before_request
+    def _start_timer():
+        g.request_started = time.perf_counter()
+        cookie = request.cookies.get(app.config["SESSION_COOKIE_NAME"])
+        if cookie:
+            COOKIE_BYTES.observe(request.endpoint or "none", len(cookie))
+
+    @app.teardown_request
+    def _stop_timer(exc):
+        started = g.pop("request_started", None)
+        if started is not None:
+            REQUEST_SECONDS.observe(f"{request.method} {request.endpoint}", time.perf_counter() - started)
+
+    @app.route("/metrics")
+    def metrics():
+        _metrics_access()
+        pid = os.getpid()
+        lines = [line for h in HISTOGRAMS for line in h.expose(pid)] + expose_caches(pid)
+        return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+    @app.route("/metrics/profile", methods=["GET", "POST"])
+    def metrics_profile():
+        # GET: the samples so far; POST ?enable=1 / ?enable=0 (with the token): start / stop
+        _metrics_access()
+        if request.method == "POST":
+            if not _has_token():
+                abort(403)
+            enable = request.args.get("enable")
+            if enable == "1":
+                PROFILER.samples.clear()
+                PROFILER.start()
+            elif enable == "0":
+                PROFILER.stop()
+        status = "running" if PROFILER.running else "stopped"
+        return Response(f"# profiler {status}\n" + PROFILER.report(), mimetype="text/plain")
@@ -1,24 +1,28 @@
 # michel_quiz.py
+# Quiz content lives in quizzes/<slug>.json (see quiz_compiler.py); this module
+# loads it into a Quiz and does the scoring. TRAITS / MICHELS / QUESTIONS and the
+# module-level functions below refer to the default quiz loaded at import.
 from __future__ import annotations
+import json
+import math
+import os
+import random
+import threading
+import time
+from bisect import bisect_right
 from dataclasses import dataclass
-from typing import Dict, List, Tuple
+from functools import cached_property, lru_cache
+from itertools import product
+from operator import add, itemgetter
+from typing import Dict, List, Optional, Tuple
+
+QUIZ_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "quizzes")
+LEVELS = ["low", "medium", "high"]  # punchline levels, same order as quiz_compiler.LEVELS
+DEFAULT_THRESHOLDS = (3, 6)  # trait value >= 3: medium, >= 6: high
+# Replayed answer prefixes kept per quiz, for each of progress_traits / progress_state
+# (~0.5 KB an entry). The ones in use are the live runs' latest prefixes.
+PROGRESS_CACHE_SIZE = int(os.environ.get("PROGRESS_CACHE_SIZE", "8192"))
 
-# -------------------------
-# Traits (latent dimensions)
-# -------------------------
-TRAITS = [
-    "energy",
-    "chaos",
-    "self_awareness",
-    "aesthetic",
-    "physicality",
-    "emotionality",
-    "social_display",
-    "escapism",
-]
-
-def empty_traits() -> Dict[str, int]:
-    return {t: 0 for t in TRAITS}
 
 def add_traits(base: Dict[str, int], delta: Dict[str, int]) -> Dict[str, int]:
     out = dict(base)
@@ -56,195 +60,35 @@ class Question:
     options: List[Option]
 
 
-# -------------------------
-# Michels (20)
-# NOTE: Update the 'media' filenames to match your actual files in static/pics/
-# -------------------------
-MICHELS: List[Michel] = [
-    Michel(1,  "Pole Dancer Michel",      "Unhinged grace. Zero fear. Maximum spin.",     "pics/michel_pole_dancer.mp4", "video",
-           {"energy": 4, "chaos": 5, "physicality": 5, "social_display": 4, "aesthetic": 2}),
-    Michel(2,  "Insta Model Michel",      "Angles. Lighting. Main character energy.",    "pics/michel_insta_model.jpg", "image",
-           {"aesthetic": 5, "social_display": 4, "self_awareness": 2, "energy": 2}),
-    Michel(3,  "Batman Michel",           "Brooding protector. Dramatic entrances only.", "pics/michel_batman.jpg", "image",
-           {"aesthetic": 3, "self_awareness": 3, "social_display": 2, "chaos": 2}),
-    Michel(4,  "Acrobatic Michel",        "Physics is optional.",                         "pics/michel_acrobatic.mp4", "video",
-           {"physicality": 5, "energy": 4, "chaos": 3}),
-    Michel(5,  "Cry Baby Michel",         "Feels everything. Says 'I’m fine'. Not fine.", "pics/michel_cry_baby.mp4", "video",
-           {"emotionality": 5, "energy": 1, "self_awareness": 3}),
-    Michel(6,  "Sleepy Michel",           "Battery at 2%. Still scrolling.",              "pics/michel_sleepy.mp4", "video",
-           {"escapism": 5, "energy": 0, "self_awareness": 2}),
-    Michel(7,  "Swag Michel",             "Vintage Facebook drip. Legendary cringe.",     "pics/michel_swag.jpg", "image",
-           {"social_display": 5, "aesthetic": 2, "self_awareness": 0, "chaos": 2}),
-    Michel(8,  "Hedgehog Michel",         "Short hair. Sharp vibe. Speedrun life.",       "pics/michel_hedgehog.jpg", "image",
-           {"energy": 3, "self_awareness": 3, "aesthetic": 2}),
-    Michel(9,  "Beaten Up Michel",        "Still standing. Somehow. Don’t ask.",          "pics/michel_beaten_up.jpg", "image",
-           {"chaos": 4, "physicality": 2, "emotionality": 2, "self_awareness": 2}),
-    Michel(10, "Fashion Icon Michel",     "Serving looks. Serving mystery. Serving late.", "pics/michel_fashion_icon.jpg", "image",
-           {"aesthetic": 5, "self_awareness": 3, "social_display": 2}),
-    Michel(11, "Mountain Hiker Michel",   "If there’s fog, you climb harder.",            "pics/michel_mountain_hiker.jpg", "image",
-           {"escapism": 5, "physicality": 4, "self_awareness": 4, "energy": 2}),
-    Michel(12, "Karate Kid Michel",       "Hands rated E for everyone.",                  "pics/michel_karate_kid.jpg", "image",
-           {"physicality": 4, "energy": 3, "chaos": 2}),
-    Michel(13, "Fragile Michel",          "Soft boy era. Vulnerable but aesthetic.",      "pics/michel_fragile.jpg", "image",
-           {"emotionality": 4, "aesthetic": 3, "self_awareness": 3, "energy": 1}),
-    Michel(14, "Gym Bro Michel",          "Mirror first. Gains forever.",                  "pics/michel_gym_bro.jpg", "image",
-           {"physicality": 5, "social_display": 3, "self_awareness": 2, "energy": 2}),
-    Michel(15, "Smoker Michel",           "Drama in the air. Literally.",                  "pics/michel_smoker.jpg", "image",
-           {"escapism": 3, "chaos": 3, "self_awareness": 2, "aesthetic": 2}),
-    Michel(16, "Soulless Michel",         "Eyes open. Brain offline.",                     "pics/michel_soulless.jpg", "image",
-           {"escapism": 5, "self_awareness": 1, "energy": 1}),
-    Michel(17, "Life Enjoyer Michel",     "Cake. Sun. Vibes. Repeat.",                      "pics/michel_life_enjoyer.jpg", "image",
-           {"emotionality": 4, "self_awareness": 4, "energy": 3, "aesthetic": 2}),
-    Michel(18, "Performative Male Michel","Bro is performing masculinity in 4K.",          "pics/michel_performative_male.jpg", "image",
-           {"social_display": 5, "self_awareness": 1, "energy": 2, "chaos": 2}),
-    Michel(19, "Mysterious Michel",       "Mask on. Lore hidden. Aura loud.",              "pics/michel_mysterious.jpg", "image",
-           {"aesthetic": 5, "escapism": 4, "self_awareness": 2}),
-    Michel(20, "Foggy Michel",            "Lost in the mist. Found in the mood.",          "pics/michel_foggy.jpg", "image",
-           {"escapism": 5, "aesthetic": 4, "self_awareness": 2}),
-]
+@dataclass(frozen=True)
+class ScoreState:
+    # Running totals for one answer sequence, so each answer is an O(n_michels) update
+    vector: Tuple[int, ...]  # traits, in trait order
+    dots: Tuple[int, ...]    # dot(vector, profile) for every Michel, in michels order
+    sq_norm: int             # ||vector||^2
 
 
 # -------------------------
-# Questions (16)
-# Each option modifies TRAITS (not Michels directly)
+# Quiz progress
+# A whole run packs into one int: a leading 1 bit, then 2 bits per answer
+# (the option's index in question.options, so at most 4 options per question).
 # -------------------------
-QUESTIONS: List[Question] = [
-    Question(1, "It’s 2am. You are:",
-        [
-            Option("A", "Still outside. No plan. Vibes only.", {"energy": 2, "chaos": 2, "social_display": 1}),
-            Option("B", "In bed. Phone on face. Doomscrolling.", {"escapism": 3}),
-            Option("C", "Taking a pic “for memories”.", {"aesthetic": 2, "self_awareness": 1}),
-            Option("D", "Overthinking one sentence from 2019.", {"emotionality": 2, "self_awareness": 1}),
-        ]
-    ),
-    Question(2, "Your friends would describe you as:",
-        [
-            Option("A", "Unhinged but iconic.", {"chaos": 3, "social_display": 1}),
-            Option("B", "Calm… maybe too calm.", {"escapism": 2, "self_awareness": 1}),
-            Option("C", "Trying something new every week.", {"energy": 2, "physicality": 1}),
-            Option("D", "Impossible to read.", {"aesthetic": 1, "self_awareness": 1, "escapism": 1}),
-        ]
-    ),
-    Question(3, "Pick your natural habitat:",
-        [
-            Option("A", "Gym mirror.", {"physicality": 3, "social_display": 1}),
-            Option("B", "Airport / train station.", {"escapism": 3, "energy": 1}),
-            Option("C", "Café with plants.", {"aesthetic": 2, "emotionality": 1}),
-            Option("D", "Anywhere as long as people see me.", {"social_display": 3}),
-        ]
-    ),
-    Question(4, "Your relationship with pain:",
-        [
-            Option("A", "Builds character.", {"physicality": 2, "self_awareness": 1}),
-            Option("B", "I post about it.", {"emotionality": 2, "social_display": 1}),
-            Option("C", "I ignore it.", {"escapism": 2}),
-            Option("D", "It already built me.", {"self_awareness": 2}),
-        ]
-    ),
-    Question(5, "Your biggest weakness:",
-        [
-            Option("A", "Validation.", {"social_display": 2}),
-            Option("B", "Comfort.", {"escapism": 2}),
-            Option("C", "Impulsivity.", {"chaos": 2}),
-            Option("D", "Sensitivity.", {"emotionality": 2}),
-        ]
-    ),
-    Question(6, "Pick an aesthetic:",
-        [
-            Option("A", "Blurry and accidental (but artsy).", {"aesthetic": 2, "escapism": 1}),
-            Option("B", "Gym lighting. Veins visible.", {"physicality": 2, "social_display": 1}),
-            Option("C", "Overexposed selfie. No regrets.", {"social_display": 2}),
-            Option("D", "No face. Just vibes.", {"self_awareness": 2, "aesthetic": 1}),
-        ]
-    ),
-    Question(7, "Conflict style:",
-        [
-            Option("A", "Dramatic silence.", {"emotionality": 2}),
-            Option("B", "Physical outlet.", {"physicality": 2, "chaos": 1}),
-            Option("C", "Disappear for 72h.", {"escapism": 3}),
-            Option("D", "Irony and memes.", {"self_awareness": 2, "aesthetic": 1}),
-        ]
-    ),
-    Question(8, "Pick a smell:",
-        [
-            Option("A", "Sweat (effort).", {"physicality": 2}),
-            Option("B", "Smoke (bad decisions).", {"chaos": 1, "escapism": 1}),
-            Option("C", "Fresh air (mountain brain).", {"escapism": 2, "self_awareness": 1}),
-            Option("D", "Coffee & pastries (life is sweet).", {"emotionality": 1, "aesthetic": 1}),
-        ]
-    ),
-    Question(9, "Your camera roll is mostly:",
-        [
-            Option("A", "Me. Different angles. Same face.", {"social_display": 2, "aesthetic": 1}),
-            Option("B", "Landscapes and skies.", {"escapism": 2}),
-            Option("C", "Screenshots of chaos.", {"chaos": 1, "self_awareness": 1}),
-            Option("D", "Friends / cute moments.", {"emotionality": 2}),
-        ]
-    ),
-    Question(10, "You feel most alive when:",
-        [
-            Option("A", "Being watched.", {"social_display": 3}),
-            Option("B", "Moving your body.", {"physicality": 3, "energy": 1}),
-            Option("C", "Alone, no noise.", {"escapism": 3}),
-            Option("D", "Feeling deeply.", {"emotionality": 3}),
-        ]
-    ),
-    Question(11, "Pick a pace:",
-        [
-            Option("A", "Sprint.", {"energy": 2}),
-            Option("B", "Drift.", {"escapism": 2}),
-            Option("C", "Pose.", {"aesthetic": 2, "social_display": 1}),
-            Option("D", "Collapse.", {"energy": -1, "escapism": 1, "emotionality": 1}),
-        ]
-    ),
-    Question(12, "Your inner voice says:",
-        [
-            Option("A", "Do it.", {"chaos": 2, "energy": 1}),
-            Option("B", "Rest.", {"escapism": 2}),
-            Option("C", "Document this.", {"social_display": 2, "aesthetic": 1}),
-            Option("D", "Why am I like this?", {"self_awareness": 2}),
-        ]
-    ),
-    Question(13, "Choose one word:",
-        [
-            Option("A", "Soft.", {"emotionality": 2}),
-            Option("B", "Sharp.", {"physicality": 2}),
-            Option("C", "Fog.", {"escapism": 2, "aesthetic": 1}),
-            Option("D", "Mask.", {"aesthetic": 2, "self_awareness": 1}),
-        ]
-    ),
-    Question(14, "Your energy today is:",
-        [
-            Option("A", "Dangerous.", {"chaos": 2, "energy": 1}),
-            Option("B", "Stable.", {"self_awareness": 2}),
-            Option("C", "Gone.", {"escapism": 2}),
-            Option("D", "Performative.", {"social_display": 2}),
-        ]
-    ),
-    Question(15, "What would hurt most?",
-        [
-            Option("A", "Being ignored.", {"social_display": 2, "emotionality": 1}),
-            Option("B", "Losing freedom.", {"escapism": 2}),
-            Option("C", "Being weak.", {"physicality": 2, "self_awareness": 1}),
-            Option("D", "Being misunderstood.", {"emotionality": 2, "self_awareness": 1}),
-        ]
-    ),
-    Question(16, "Be honest. I’m basically:",
-        [
-            Option("A", "A phase.", {"aesthetic": 2}),
-            Option("B", "A mood.", {"escapism": 2}),
-            Option("C", "A problem.", {"chaos": 2}),
-            Option("D", "Trying.", {"self_awareness": 2, "emotionality": 1}),
-        ]
-    ),
-]
+START = 1
+
+def record_answer(progress: int, option_idx: int) -> int:
+    return (progress << 2) | option_idx
+
+def answered_count(progress: int) -> int:
+    return (progress.bit_length() - 1) // 2
+
+def answer_indexes(progress: int) -> List[int]:
+    n = answered_count(progress)
+    return [(progress >> (2 * (n - 1 - i))) & 3 for i in range(n)]
 
 
 # -------------------------
 # Scoring
 # -------------------------
-import math
-
 def _norm(vec: Dict[str, int]) -> float:
     return math.sqrt(sum((vec.get(t, 0) ** 2) for t in TRAITS))
 
@@ -262,133 +106,429 @@ def michel_score(user_traits: Dict[str, int], michel: Michel) -> float:
 
     return _dot(user_traits, michel.profile) / (u_norm * p_norm)
 
+_by_score = itemgetter(1)
+
+def numpy():
+    # NumPy, or None. Imported on first use: it is optional and only the offline batch
+    # paths (rank_matrix, outcomes.py) need it, so workers never pay for the import.
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+def level_code(traits: Dict[str, int], names: Tuple[str, ...],
+               thresholds: Tuple[int, ...] = DEFAULT_THRESHOLDS) -> int:
+    # The levels (LEVELS indexes) of traits[name] for each name, packed as base-3 digits,
+    # first name most significant. Missing traits are 0. Reads the dict directly: this is
+    # on the /result path, and building a list of values first doubles its cost.
+    code = 0
+    for name in names:
+        code = code * 3 + bisect_right(thresholds, traits.get(name, 0))
+    return code
+
+
+class Quiz:
+    # One loaded quiz. Everything derived from the content (packed profiles,
+    # the progress cache) hangs off the instance, so swapping quizzes is just
+    # swapping the object.
+    def __init__(self, slug: str, version: str, traits: List[str], michels: List[Michel],
+                 questions: List[Question], punchlines: Dict[int, list],
+                 thresholds: Tuple[int, ...] = DEFAULT_THRESHOLDS):
+        self.slug = slug
+        self.version = version
+        self.traits = traits
+        self.michels = michels
+        self.questions = questions
+        self.punchlines = punchlines
+        self.thresholds = tuple(thresholds)
+        # Profiles packed once: (michel, nonzero (trait index, weight) pairs, ||profile||).
+        # Scores are computed with the exact same expression as michel_score, so the
+        # floats (and therefore the sort / tie order) are identical.
+        self._profiles: List[Tuple[Michel, Tuple[Tuple[int, int], ...], float]] = [
+            (m, tuple((i, m.profile[t]) for i, t in enumerate(traits) if m.profile.get(t, 0)),
+             math.sqrt(sum(m.profile.get(t, 0) ** 2 for t in traits)))
+            for m in michels
+        ]
+        self.michels_by_id = {m.id: m for m in michels}
+        # Only unfinished runs are cached: every finished progress is all but unique
+        # (4^16 answer paths), and its result is cached per trait vector in app.py
+        self._prefix_traits = lru_cache(maxsize=PROGRESS_CACHE_SIZE)(self._progress_traits)
+        self._prefix_state = lru_cache(maxsize=PROGRESS_CACHE_SIZE)(self._progress_state)
+        self._finished_from = START << (2 * len(questions))  # progress >= this: every question answered
+
+    def __repr__(self) -> str:
+        return f"<Quiz {self.slug} {self.version[:12]}>"
+
+    # The larger tables are built on first use: every quiz in quizzes/ (and every
+    # hot-swapped version) is loaded at startup, most of them never get a request.
+    @cached_property
+    def _option_updates(self):
+        # Per option: (nonzero (trait index, weight) pairs, dot(delta, profile) per Michel, ||delta||^2)
+        traits, michels = self.traits, self.michels
+        return [
+            [(tuple((i, o.delta[t]) for i, t in enumerate(traits) if o.delta.get(t, 0)),
+              tuple(sum(o.delta.get(t, 0) * m.profile.get(t, 0) for t in traits) for m in michels),
+              sum(o.delta.get(t, 0) ** 2 for t in traits))
+             for o in q.options]
+            for q in self.questions
+        ]
+
+    @cached_property
+    def _punchline_tables(self):
+        return {cid: self._decision_table(items) for cid, items in self.punchlines.items()}
+
+    @cached_property
+    def _profile_matrix(self):
+        # rank_matrix's inputs: (profiles as an n_michels x n_traits int64 array, ||profile||, Michel ids)
+        np = numpy()
+        return (np.array([[m.profile.get(t, 0) for t in self.traits] for m in self.michels], dtype=np.int64),
+                np.array([p_norm for _, _, p_norm in self._profiles]),
+                np.array([m.id for m in self.michels]))
+
+    def warm(self) -> None:
+        # Builds the lazy tables now, e.g. in the gunicorn master before fork so
+        # every worker shares one copy (copy-on-write) instead of building its own
+        self._option_updates
+        self._punchline_tables
+
+    def empty_traits(self) -> Dict[str, int]:
+        return {t: 0 for t in self.traits}
+
+    def progress_traits(self, progress: int) -> Dict[str, int]:
+        # The returned dict is shared between callers: don't mutate it.
+        if progress < self._finished_from:
+            return self._prefix_traits(progress)
+        return self._progress_traits(progress)
+
+    def _progress_traits(self, progress: int) -> Dict[str, int]:
+        # Replays the answers; every prefix is cached too, so a new answer costs one add_traits.
+        n = answered_count(progress)
+        if n == 0:
+            return self.empty_traits()
+        if n > len(self.questions):  # progress from before a quiz swap: extra answers are ignored
+            return self.progress_traits(progress >> (2 * (n - len(self.questions))))
+        options = self.questions[n - 1].options
+        delta = options[progress & 3].delta if (progress & 3) < len(options) else {}
+        return add_traits(self.progress_traits(progress >> 2), delta)
+
+    def empty_state(self) -> ScoreState:
+        return ScoreState((0,) * len(self.traits), (0,) * len(self.michels), 0)
+
+    def add_answer(self, state: ScoreState, q_idx: int, option_idx: int) -> ScoreState:
+        pairs, dots, delta_sq = self._option_updates[q_idx][option_idx]
+        vector = list(state.vector)
+        cross = 0
+        for i, w in pairs:
+            cross += vector[i] * w
+            vector[i] += w
+        # ||u + d||^2 = ||u||^2 + 2 u.d + ||d||^2
+        return ScoreState(tuple(vector), tuple(map(add, state.dots, dots)), state.sq_norm + 2 * cross + delta_sq)
+
+    def progress_state(self, progress: int) -> ScoreState:
+        if progress < self._finished_from:
+            return self._prefix_state(progress)
+        return self._progress_state(progress)
+
+    def _progress_state(self, progress: int) -> ScoreState:
+        # Same replay as progress_traits: with the prefix cached, one add_answer per answer
+        n = answered_count(progress)
+        if n == 0:
+            return self.empty_state()
+        if n > len(self.questions):  # progress from before a quiz swap: extra answers are ignored
+            return self.progress_state(progress >> (2 * (n - len(self.questions))))
+        state = self.progress_state(progress >> 2)
+        if (progress & 3) >= len(self.questions[n - 1].options):
+            return state
+        return self.add_answer(state, n - 1, progress & 3)
+
+    def state_scores(self, state: ScoreState) -> List[float]:
+        # Same floats as rank_michels on the same traits, in michels order
+        if state.sq_norm == 0:
+            return [0.0] * len(self.michels)
+        u_norm = math.sqrt(state.sq_norm)
+        return [dot / (u_norm * p_norm) if p_norm else 0.0
+                for dot, (_, _, p_norm) in zip(state.dots, self._profiles)]
+
+    def leader(self, state: ScoreState) -> Optional[Michel]:
+        # rank_michels(...)[0][0] without the sort; None before any trait has moved
+        if state.sq_norm == 0:
+            return None
+        scores = self.state_scores(state)
+        return self.michels[scores.index(max(scores))]
+
+    def _rank_vector(self, u: Tuple[int, ...]) -> List[Tuple[Michel, float]]:
+        u_norm = math.sqrt(sum(x * x for x in u))
+        if u_norm == 0:
+            return [(m, 0.0) for m, _, _ in self._profiles]
+        scored = [
+            (m, sum(u[i] * w for i, w in p) / (u_norm * p_norm) if p_norm else 0.0)
+            for m, p, p_norm in self._profiles
+        ]
+        scored.sort(key=_by_score, reverse=True)
+        return scored
+
+    def trait_vector(self, user_traits: Dict[str, int]) -> Tuple[int, ...]:
+        return tuple(user_traits.get(t, 0) for t in self.traits)
+
+    def rank_michels(self, user_traits: Dict[str, int]) -> List[Tuple[Michel, float]]:
+        return self._rank_vector(self.trait_vector(user_traits))
+
+    def rank_many(self, trait_matrix) -> List[List[Tuple[Michel, float]]]:
+        # Batch scoring for analytics: rows are trait dicts or sequences in trait order.
+        # Identical rows are ranked once and share the same result list.
+        seen: Dict[Tuple[int, ...], List[Tuple[Michel, float]]] = {}
+        out = []
+        for row in trait_matrix:
+            u = self.trait_vector(row) if isinstance(row, dict) else tuple(row)
+            ranked = seen.get(u)
+            if ranked is None:
+                ranked = seen[u] = self._rank_vector(u)
+            out.append(ranked)
+        return out
+
+    def rank_matrix(self, trait_matrix):
+        # NumPy batch path for scoring millions of archived runs: rows are trait
+        # sequences in trait order (an n x len(traits) int array-like).
+        # -> (winner id per row, winner score per row) as arrays, no per-row lists.
+        # Dots are exact int64 and the division is the same float expression as
+        # _rank_vector, so scores match bit for bit; argmax keeps the first of tied
+        # Michels, which is rank_michels' tie order.
+        np = numpy()
+        if np is None:
+            raise ImportError("rank_matrix needs numpy (pip install numpy)")
+        profiles, p_norm, ids = self._profile_matrix
+        u = np.asarray(trait_matrix, dtype=np.int64).reshape(-1, len(self.traits))
+        u_norm = np.sqrt((u * u).sum(axis=1))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scores = (u @ profiles.T) / (u_norm[:, None] * p_norm[None, :])
+        scores[:, p_norm == 0] = 0.0
+        scores[u_norm == 0] = 0.0
+        best = scores.argmax(axis=1)
+        return ids[best], scores[np.arange(len(best)), best]
+
+    def sample_traits(self, n: int, seed: int = 0) -> List[Dict[str, int]]:
+        # Final traits of n users answering uniformly at random.
+        # (The full answer tree has 4^16 paths and well over 10^7 distinct trait
+        # vectors, so sampling is how we get a representative set.)
+        rng = random.Random(seed)
+        out = []
+        for _ in range(n):
+            traits = self.empty_traits()
+            for q in self.questions:
+                traits = add_traits(traits, rng.choice(q.options).delta)
+            out.append(traits)
+        return out
+
+    def best_michel(self, user_traits: Dict[str, int]) -> Michel:
+        return self.rank_michels(user_traits)[0][0]
+
+    def _decision_table(self, items: list):
+        # -> (trait names the conditions look at, their indexes, {level code: lines}).
+        # The level code packs those traits' level indexes as base-3 digits; every
+        # combination is resolved here, so picking is one dict lookup.
+        relevant = sorted({self.traits.index(it[0]) for it in items if not isinstance(it, str)})
+        names = tuple(self.traits[i] for i in relevant)
+        # one trait value inside each level, so the keys come from level_code itself
+        at_level = (self.thresholds[0] - 1,) + tuple(self.thresholds)
+        table = {}
+        for levels in product(range(len(LEVELS)), repeat=len(relevant)):
+            level_of = dict(zip(names, levels))
+            chosen = [it if isinstance(it, str) else it[2] for it in items
+                      if isinstance(it, str) or LEVELS.index(it[1]) == level_of[it[0]]]
+            code = level_code({name: at_level[lv] for name, lv in level_of.items()}, names, self.thresholds)
+            # Keep it short: max 3 lines
+            table[code] = chosen[:3]
+        return names, tuple(relevant), table
+
+    def pick_punchlines(self, winner_id: int, traits: Dict[str, int]) -> list[str]:
+        # The returned list is shared between callers: don't mutate it.
+        entry = self._punchline_tables.get(winner_id)
+        if entry is None:
+            return []
+        names, _, table = entry
+        return table[level_code(traits, names, self.thresholds)]
+
+    def pick_punchlines_many(self, rows) -> List[list[str]]:
+        # Batch mode for reports: rows are (winner id, traits) with traits a dict or a
+        # sequence in trait order (e.g. outcome table keys).
+        thresholds = self.thresholds
+        tables = self._punchline_tables
+        out = []
+        for winner_id, traits in rows:
+            entry = tables.get(winner_id)
+            if entry is None:
+                out.append([])
+                continue
+            names, relevant, table = entry
+            if isinstance(traits, dict):
+                code = level_code(traits, names, thresholds)
+            else:
+                code = 0  # level_code, by trait index
+                for i in relevant:
+                    code = code * 3 + bisect_right(thresholds, traits[i])
+            out.append(table[code])
+        return out
+
+
+# -------------------------
+# Loading
+# -------------------------
+def _weights(traits: List[str], vec: List[int]) -> Dict[str, int]:
+    return {t: v for t, v in zip(traits, vec) if v}
+
+def from_compiled(data: dict) -> Quiz:
+    traits = data["traits"]
+    michels = [
+        Michel(cid, name, tagline, media_path, media_type, _weights(traits, vec))
+        for cid, name, tagline, media_path, media_type, vec in data["characters"]
+    ]
+    questions = [
+        Question(qid, text, [Option(key, o_text, _weights(traits, vec)) for key, o_text, vec in options])
+        for qid, text, options in data["questions"]
+    ]
+    punchlines = {
+        int(cid): [it if isinstance(it, str) else (traits[it[0]], LEVELS[it[1]], it[2]) for it in items]
+        for cid, items in data["punchlines"].items()
+    }
+    return Quiz(data["slug"], data["version"], traits, michels, questions, punchlines,
+                data.get("thresholds", DEFAULT_THRESHOLDS))
+
+def load_quiz(path: str) -> Quiz:
+    # Compiled files (quiz_compiler.py output) load directly; a plain definition is
+    # validated and compiled in memory first.
+    import quiz_compiler
+
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if "format" not in data:
+        errors, _ = quiz_compiler.validate(data)
+        if errors:
+            raise ValueError(f"{path}: " + "; ".join(errors))
+        data = quiz_compiler.compile_quiz(data)
+    else:  # compiled by quiz_compiler, but the slug still ends up in URLs and paths
+        errors = quiz_compiler.slug_errors(data.get("slug"))
+        if errors:
+            raise ValueError(f"{path}: " + "; ".join(errors))
+    return from_compiled(data)
+
+
+def _mtime(path: str) -> Optional[float]:
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+class QuizFile:
+    # The quiz behind a definition file, reloaded when it (or its compiled form) changes.
+    # Each worker checks the mtime at most once per `interval` seconds; compiles are
+    # written with os.replace and the swap is one attribute assignment, so a request
+    # sees either the old quiz or the new one, never a mix.
+    def __init__(self, source: str, interval: float = 1.0, on_error=None, on_swap=None):
+        self.source = source
+        self.interval = interval
+        self.on_error = on_error
+        self.on_swap = on_swap  # on_swap(old, new): drop whatever is still cached for the old quiz
+        self._lock = threading.Lock()
+        self._checked = 0.0
+        self._stamp = self._current()
+        self.quiz = load_quiz(self._stamp[0])
+
+    def _current(self) -> Tuple[str, float]:
+        # -> (path to load, its mtime): the compiled file unless the source is newer
+        compiled = os.path.splitext(self.source)[0] + ".compiled.json"
+        c_mtime, s_mtime = _mtime(compiled), _mtime(self.source)
+        if c_mtime is not None and (s_mtime is None or c_mtime >= s_mtime):
+            return compiled, c_mtime
+        if s_mtime is None:
+            raise FileNotFoundError(self.source)
+        return self.source, s_mtime
+
+    def get(self) -> Quiz:
+        now = time.monotonic()
+        if now - self._checked >= self.interval and self._lock.acquire(blocking=False):
+            try:
+                self._checked = now
+                stamp = self._current()
+                if stamp != self._stamp:
+                    self._stamp = stamp
+                    new = load_quiz(stamp[0])
+                    if new.slug != self.quiz.slug:
+                        # everything outside (registry, analytics, URLs) is keyed by the slug
+                        raise ValueError(f"{stamp[0]}: slug changed from {self.quiz.slug!r} to {new.slug!r}; "
+                                         "a new slug needs a new file and a restart")
+                    old, self.quiz = self.quiz, new
+                    if self.on_swap is not None:
+                        self.on_swap(old, self.quiz)
+            except Exception as e:
+                # a broken edit (whatever it breaks) keeps the previous quiz serving
+                if self.on_error is not None:
+                    self.on_error(e)
+            finally:
+                self._lock.release()
+        return self.quiz
+
+
+class QuizRegistry:
+    # slug -> QuizFile. Each quiz keeps its own trait space, packed profiles and
+    # progress cache; a lookup is one dict get, whatever the number of quizzes.
+    def __init__(self, quiz_files=()):
+        self.files: Dict[str, QuizFile] = {qf.quiz.slug: qf for qf in quiz_files}
+
+    def scan(self, directory: str = QUIZ_DIR, on_error=None, on_swap=None) -> None:
+        # Adds every definition in directory (<slug>.json and/or <slug>.compiled.json).
+        # New files need a restart (or another scan); edits to known ones are picked up by QuizFile.
+        known = {os.path.abspath(qf.source) for qf in self.files.values()}
+        stems = sorted({name[:-len(".compiled.json")] if name.endswith(".compiled.json") else name[:-len(".json")]
+                        for name in os.listdir(directory) if name.endswith(".json")})
+        for stem in stems:
+            source = os.path.abspath(os.path.join(directory, stem + ".json"))
+            if source in known:
+                continue
+            try:
+                qf = QuizFile(source, on_error=on_error, on_swap=on_swap)
+            except Exception as e:  # one bad file must not take the other quizzes down
+                if on_error is not None:
+                    on_error(e)
+                continue
+            if qf.quiz.slug in self.files:
+                if on_error is not None:
+                    on_error(ValueError(f"{source}: slug {qf.quiz.slug!r} is already served from "
+                                        f"{self.files[qf.quiz.slug].source}; skipped"))
+                continue
+            self.files[qf.quiz.slug] = qf
+
+    def get(self, slug: str) -> Optional[Quiz]:
+        qf = self.files.get(slug)
+        return qf.get() if qf is not None else None
+
+    def __iter__(self):
+        return iter(self.files)
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+
+def _default_source() -> str:
+    return os.environ.get("QUIZ_FILE") or os.path.join(QUIZ_DIR, "michel.json")
+
+DEFAULT_QUIZ_FILE = QuizFile(_default_source())
+QUIZ = DEFAULT_QUIZ_FILE.quiz
+
+# Default quiz, as module-level names (scripts, benchmarks, offline tables)
+TRAITS = QUIZ.traits
+MICHELS = QUIZ.michels
+QUESTIONS = QUIZ.questions
+MICHEL_PUNCHLINES = QUIZ.punchlines
 
-def rank_michels(user_traits: Dict[str, int]) -> List[Tuple[Michel, float]]:
-    scored = [(m, michel_score(user_traits, m)) for m in MICHELS]
-    scored.sort(key=lambda x: x[1], reverse=True)
-    return scored
-
-def best_michel(user_traits: Dict[str, int]) -> Michel:
-    return rank_michels(user_traits)[0][0]
-
-def trait_level(value: int) -> str:
-    if value >= 6: return "high"
-    if value >= 3: return "medium"
-    return "low"
-
-# Base one-liner + conditional lines per Michel
-MICHEL_PUNCHLINES = {
-    1: [
-        "You treat gravity like a suggestion.",
-        ("chaos", "high", "You would do a backflip in a Lidl parking lot if dared."),
-        ("social_display", "high", "You need an audience. Respectfully: understandable."),
-    ],
-    2: [
-        "Your front camera has seen things.",
-        ("aesthetic", "high", "You can’t relax until the lighting is correct."),
-        ("social_display", "high", "If it wasn’t posted, did it even happen?"),
-    ],
-    3: [
-        "Brooding is a full-time job for you.",
-        ("self_awareness", "high", "You know exactly what you’re doing and it’s terrifying."),
-        ("chaos", "high", "You’re one soundtrack away from committing to the bit."),
-    ],
-    4: [
-        "Your hobbies are illegal in at least 3 physics textbooks.",
-        ("energy", "high", "You were born with 2x battery capacity."),
-        ("chaos", "high", "Safety? Never heard of her."),
-    ],
-    5: [
-        "You feel everything. Including the vibes in the air.",
-        ("emotionality", "high", "You can cry to a song you don’t even like."),
-        ("self_awareness", "high", "You know it’s dramatic. You still do it."),
-    ],
-    6: [
-        "You’re not lazy. You’re in power-saving mode.",
-        ("escapism", "high", "Reality is optional and you chose ‘skip’."),
-        ("energy", "low", "If you move, it better be for snacks."),
-    ],
-    7: [
-        "The drip is ancient. The confidence is eternal.",
-        ("social_display", "high", "You were built for captions like ‘haters will say it’s fake’."),
-        ("self_awareness", "low", "Self-awareness? Not required when aura is this loud."),
-    ],
-    8: [
-        "You look like you finish tasks early and judge people silently.",
-        ("self_awareness", "high", "You clock everything. Nothing escapes you."),
-        ("energy", "high", "You’d speed-walk to a party and still arrive early."),
-    ],
-    9: [
-        "You’ve been through things and still showed up.",
-        ("chaos", "high", "Your life is a side quest with damage taken."),
-        ("self_awareness", "high", "You learned the lesson. The hard way."),
-    ],
-    10: [
-        "Fashion is your love language.",
-        ("aesthetic", "high", "You can’t be ugly. It’s against your constitution."),
-        ("self_awareness", "high", "You act mysterious on purpose. It’s working."),
-    ],
-    11: [
-        "You disappear into nature to reset your soul.",
-        ("escapism", "high", "If there’s no signal, you thrive."),
-        ("physicality", "high", "You call suffering ‘a nice hike’."),
-    ],
-    12: [
-        "You have ‘friendly violence’ energy.",
-        ("physicality", "high", "You could kick a door open politely."),
-        ("chaos", "high", "You’d spar just to feel alive."),
-    ],
-    13: [
-        "Soft, sensitive, and weirdly poetic about it.",
-        ("emotionality", "high", "You get hurt by tone of voice."),
-        ("aesthetic", "high", "Even your sadness has good composition."),
-    ],
-    14: [
-        "Protein is a personality trait for you.",
-        ("physicality", "high", "You measure progress in grams and ego."),
-        ("social_display", "high", "You ‘accidentally’ walk past mirrors."),
-    ],
-    15: [
-        "Cinematic stress. Main character break time.",
-        ("escapism", "high", "You step outside to ‘think’ (avoid feelings)."),
-        ("chaos", "high", "You attract bad decisions like a magnet."),
-    ],
-    16: [
-        "Mentally: not here. Spiritually: loading…",
-        ("escapism", "high", "You escape by going completely offline inside your head."),
-        ("self_awareness", "low", "Thoughts? None. Peace? Also none."),
-    ],
-    17: [
-        "You romanticize life correctly.",
-        ("emotionality", "high", "You feel joy like a profession."),
-        ("aesthetic", "high", "You’re happiest when the moment looks like a movie still."),
-    ],
-    18: [
-        "You perform. Everyone else watches.",
-        ("social_display", "high", "If nobody saw it, it doesn’t count."),
-        ("self_awareness", "low", "You might be a little… committed to the character."),
-    ],
-    19: [
-        "You keep your lore classified.",
-        ("aesthetic", "high", "You communicate in symbolism, not sentences."),
-        ("self_awareness", "high", "You weaponize silence. Respect."),
-    ],
-    20: [
-        "You are the fog. The fog is you.",
-        ("escapism", "high", "You’d rather disappear than explain."),
-        ("aesthetic", "high", "You live for moody visuals and existential calm."),
-    ],
-}
-
-def pick_punchlines(winner_id: int, traits: Dict[str, int]) -> list[str]:
-    items = MICHEL_PUNCHLINES.get(winner_id, [])
-    chosen: list[str] = []
-    for it in items:
-        if isinstance(it, str):
-            chosen.append(it)
-        else:
-            t, level, line = it
-            if trait_level(traits.get(t, 0)) == level:
-                chosen.append(line)
-    # Keep it short: max 3 lines
-    return chosen[:3]
+empty_traits = QUIZ.empty_traits
+progress_traits = QUIZ.progress_traits
+trait_vector = QUIZ.trait_vector
+rank_michels = QUIZ.rank_michels
+rank_many = QUIZ.rank_many
+rank_matrix = QUIZ.rank_matrix
+sample_traits = QUIZ.sample_traits
+best_michel = QUIZ.best_michel
+pick_punchlines = QUIZ.pick_punchlines
+pick_punchlines_many = QUIZ.pick_punchlines_many
@@ -0,0 +1,224 @@
+# quiz_compiler.py
+# Validates a quiz definition (quizzes/<slug>.json) and compiles it into the
+# integer-indexed form the app loads: profiles / deltas as int arrays in trait
+# order, punchline conditions as (trait index, level index, line), level thresholds
+# as an ascending list.
+#
+#   python quiz_compiler.py quizzes/michel.json [--strict]
+#   -> quizzes/michel.compiled.json (written atomically; running workers pick it up)
+from __future__ import annotations
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+from typing import List, Tuple
+
+FORMAT = 1
+LEVELS = ["low", "medium", "high"]
+DEFAULT_THRESHOLDS = {"medium": 3, "high": 6}  # minimum trait value for each level above "low"
+MAX_OPTIONS = 4  # progress packs each answer into 2 bits
+# analytics.RECORD ("<IQB"): progress is a u64 (start bit + 2 bits per answer), the winner
+# id a u8 where 0 means "not finished"
+MAX_QUESTIONS = 31
+MAX_CHARACTER_ID = 255
+# each character's punchline table has an entry per combination of its traits' levels (3^k)
+MAX_PUNCHLINE_TRAITS = 8
+MEDIA_TYPES = ("image", "video")
+# The slug is the quiz's URL prefix (/<slug>/question) and a file name part (analytics
+# directory, quizzes/<slug>.json); it must not collide with the app's own paths
+SLUG_PATTERN = re.compile(r"[a-z0-9][a-z0-9_-]{0,63}")
+RESERVED_SLUGS = frozenset({"static", "metrics", "question", "result", "reset"})
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+
+
+def slug_errors(slug) -> List[str]:
+    if not isinstance(slug, str) or not SLUG_PATTERN.fullmatch(slug):
+        return ["slug: needs 1-64 of a-z, 0-9, '_' and '-', starting with a letter or digit"]
+    if slug in RESERVED_SLUGS:
+        return [f"slug: {slug!r} is reserved (one of {sorted(RESERVED_SLUGS)})"]
+    return []
+
+
+def validate(src: dict, static_dir: str = STATIC_DIR) -> Tuple[List[str], List[str]]:
+    # -> (errors, warnings). Errors make the quiz unusable; warnings (e.g. missing media) don't.
+    # Wrong types are errors too: nothing past validate() has to expect them.
+    errors: List[str] = []
+    warnings: List[str] = []
+
+    if not isinstance(src, dict):
+        return ["definition must be a JSON object"], warnings
+
+    def of_type(where: str, value, kind, default):
+        # value if it has the right type, else an error and the (empty) default
+        if isinstance(value, kind) and not (kind is int and isinstance(value, bool)):
+            return value
+        errors.append(f"{where}: expected {kind.__name__}, got {type(value).__name__}")
+        return default
+
+    errors += slug_errors(src.get("slug"))
+
+    traits = of_type("traits", src.get("traits", []), list, [])
+    if not traits:
+        errors.append("no traits")
+    traits = [t for i, t in enumerate(traits) if of_type(f"traits[{i}]", t, str, None) is not None]
+    if len(set(traits)) != len(traits):
+        errors.append("duplicate trait names")
+    known = set(traits)
+
+    def check_weights(where: str, weights) -> dict:
+        weights = of_type(where, weights, dict, {})
+        for k, v in weights.items():
+            if k not in known:
+                errors.append(f"{where}: unknown trait {k!r}")
+            if not isinstance(v, int) or isinstance(v, bool):
+                errors.append(f"{where}: weight for {k!r} is not an int")
+        return weights
+
+    ids = set()
+    for c in of_type("characters", src.get("characters", []), list, []):
+        c = of_type("characters[]", c, dict, None)
+        if c is None:
+            continue
+        where = f"character {c.get('id')}"
+        cid = of_type(f"{where}: id", c.get("id"), int, None)
+        if cid in ids:
+            errors.append(f"{where}: duplicate id")
+        if cid is not None and not 1 <= cid <= MAX_CHARACTER_ID:
+            errors.append(f"{where}: id must be 1-{MAX_CHARACTER_ID}")
+        if cid is not None:
+            ids.add(cid)
+        for field in ("name", "tagline", "media"):
+            of_type(f"{where}: {field}", c.get(field), str, "")
+        if c.get("media_type") not in MEDIA_TYPES:
+            errors.append(f"{where}: media_type must be one of {MEDIA_TYPES}")
+        if isinstance(c.get("media"), str) and not os.path.isfile(os.path.join(static_dir, c["media"])):
+            warnings.append(f"{where}: media file static/{c.get('media')} does not exist")
+        if not any(check_weights(f"{where} profile", c.get("profile", {})).values()):
+            errors.append(f"{where}: empty profile")
+    if not ids:
+        errors.append("no characters")
+
+    q_ids = set()
+    for q in of_type("questions", src.get("questions", []), list, []):
+        q = of_type("questions[]", q, dict, None)
+        if q is None:
+            continue
+        where = f"question {q.get('id')}"
+        if q.get("id") in q_ids:
+            errors.append(f"{where}: duplicate id")
+        q_ids.add(q.get("id") if isinstance(q.get("id"), (int, str)) else None)
+        of_type(f"{where}: text", q.get("text"), str, "")
+        options = [o for o in of_type(f"{where}: options", q.get("options", []), list, [])
+                   if of_type(f"{where}: option", o, dict, None) is not None]
+        if not 1 <= len(options) <= MAX_OPTIONS:
+            errors.append(f"{where}: needs 1-{MAX_OPTIONS} options")
+        keys = [o.get("key") for o in options]
+        if len(set(map(str, keys))) != len(keys) or not all(isinstance(k, str) and k for k in keys):
+            errors.append(f"{where}: option keys must be unique, non-empty strings")
+        for o in options:
+            of_type(f"{where} option {o.get('key')}: text", o.get("text"), str, "")
+            check_weights(f"{where} option {o.get('key')}", o.get("delta", {}))
+    if not q_ids:
+        errors.append("no questions")
+    if len(src.get("questions") or []) > MAX_QUESTIONS:
+        errors.append(f"at most {MAX_QUESTIONS} questions")
+
+    thresholds = src.get("thresholds", DEFAULT_THRESHOLDS)
+    if (not isinstance(thresholds, dict) or set(thresholds) != set(LEVELS[1:])
+            or not all(isinstance(v, int) and not isinstance(v, bool) for v in thresholds.values())):
+        errors.append(f"thresholds: needs an int for each of {LEVELS[1:]}")
+    elif [thresholds[lv] for lv in LEVELS[1:]] != sorted(thresholds[lv] for lv in LEVELS[1:]):
+        errors.append("thresholds: must increase with the level")
+
+    for cid, items in of_type("punchlines", src.get("punchlines", {}), dict, {}).items():
+        where = f"punchlines {cid}"
+        if str(cid) not in {str(i) for i in ids}:
+            errors.append(f"{where}: unknown character")
+        for it in of_type(where, items, list, []):
+            if isinstance(it, str):
+                continue
+            it = of_type(f"{where} item", it, dict, None)
+            if it is None:
+                continue
+            if it.get("trait") not in known:
+                errors.append(f"{where}: unknown trait {it.get('trait')!r}")
+            if it.get("level") not in LEVELS:
+                errors.append(f"{where}: level must be one of {LEVELS}")
+            of_type(f"{where} line", it.get("line"), str, "")
+        conditions = {it.get("trait") for it in items if isinstance(it, dict)} if isinstance(items, list) else ()
+        if len(conditions) > MAX_PUNCHLINE_TRAITS:
+            errors.append(f"{where}: conditions on at most {MAX_PUNCHLINE_TRAITS} different traits")
+
+    return errors, warnings
+
+
+def compile_quiz(src: dict) -> dict:
+    traits = src["traits"]
+    index = {t: i for i, t in enumerate(traits)}
+    vec = lambda weights: [weights.get(t, 0) for t in traits]
+
+    out = {
+        "format": FORMAT,
+        "slug": src["slug"],
+        "traits": traits,
+        "thresholds": [src.get("thresholds", DEFAULT_THRESHOLDS)[lv] for lv in LEVELS[1:]],
+        "characters": [
+            [c["id"], c["name"], c["tagline"], c["media"], c["media_type"], vec(c["profile"])]
+            for c in src["characters"]
+        ],
+        "questions": [
+            [q["id"], q["text"], [[o["key"], o["text"], vec(o["delta"])] for o in q["options"]]]
+            for q in src["questions"]
+        ],
+        "punchlines": {
+            str(cid): [it if isinstance(it, str) else [index[it["trait"]], LEVELS.index(it["level"]), it["line"]]
+                       for it in items]
+            for cid, items in src.get("punchlines", {}).items()
+        },
+    }
+    out["version"] = hashlib.sha1(json.dumps(out, sort_keys=True).encode("utf-8")).hexdigest()
+    return out
+
+
+def compiled_path(source_path: str) -> str:
+    return os.path.splitext(source_path)[0] + ".compiled.json"
+
+
+def compile_file(source_path: str, strict: bool = False) -> str:
+    with open(source_path, encoding="utf-8") as f:
+        src = json.load(f)
+    errors, warnings = validate(src)
+    for w in warnings:
+        print(f"warning: {w}", file=sys.stderr)
+    if strict:
+        errors += warnings
+    if errors:
+        raise ValueError(f"{source_path}: " + "; ".join(errors))
+
+    out_path = compiled_path(source_path)
+    tmp = f"{out_path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(compile_quiz(src), f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, out_path)  # workers never see a half-written file
+    return out_path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Validate and compile quiz definitions")
+    parser.add_argument("sources", nargs="+")
+    parser.add_argument("--strict", action="store_true", help="treat warnings (e.g. missing media) as errors")
+    args = parser.parse_args()
+    failed = False
+    for path in args.sources:
+        try:
+            print(f"{path} -> {compile_file(path, args.strict)}")
+        except ValueError as e:
+            print(f"error: {e}", file=sys.stderr)
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
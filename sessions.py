@@ -0,0 +1,148 @@
+# sessions.py
+# Session setup that works with several gunicorn workers (and several nodes):
+# - one signing key shared by every worker: SECRET_KEY env, SECRET_KEY_FILE (a mounted
+#   secret), the shared store (SHARED_STORE, see store.py), or a key file created once
+#   in the instance folder. SECRET_KEY_FALLBACKS (comma separated) keeps cookies signed
+#   with previous keys valid during a rotation.
+# - optional server-side sessions in SQLite (SESSION_BACKEND=sqlite), the cookie only carries an id
+from __future__ import annotations
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSession, SessionInterface
+
+
+def shared_secret_key(path: str) -> str:
+    # First worker to get here creates the key; os.link never overwrites, so
+    # every worker (and every restart) ends up reading the same file.
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        # owner-only from the start: the key signs every session cookie
+        with os.fdopen(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), "w") as f:
+            f.write(secrets.token_hex(32))
+        try:
+            os.link(tmp, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.unlink(tmp)
+    with open(path) as f:
+        return f.read().strip()
+
+
+def store_secret_key(store) -> str:
+    # Same idea as shared_secret_key, across nodes: the first node to ask creates it
+    store.add("secret_key", secrets.token_hex(32).encode())
+    key = store.get("secret_key")
+    if key is None:
+        raise RuntimeError("shared store unreachable: no session signing key")
+    return key.decode()
+
+
+class ServerSideSession(SecureCookieSession):
+    def __init__(self, initial=None, sid: str = "", new: bool = False):
+        super().__init__(initial)
+        self.sid = sid
+        self.new = new
+
+
+class SqliteSessionInterface(SessionInterface):
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, path: str, ttl: float = 24 * 3600, sweep_every: int = 1000):
+        self.path = path
+        self.ttl = ttl
+        self.sweep_every = sweep_every
+        self._writes = 0
+        self._local = threading.local()
+        with self._db() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions "
+                "(sid TEXT PRIMARY KEY, data TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+
+    def _db(self) -> sqlite3.Connection:
+        # sqlite connections can't be shared between threads, nor with a forked
+        # worker (the app may be preloaded in the gunicorn master)
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db, self._local.pid = db, os.getpid()
+        return db
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            row = self._db().execute(
+                "SELECT data FROM sessions WHERE sid = ? AND expires > ?", (sid, time.time())
+            ).fetchone()
+            if row:
+                return ServerSideSession(self.serializer.loads(row[0]), sid=sid)
+        return ServerSideSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified and not session.new:
+                self._db().execute("DELETE FROM sessions WHERE sid = ?", (session.sid,))
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if not session.modified:
+            return
+
+        now = time.time()
+        self._db().execute(
+            "INSERT OR REPLACE INTO sessions (sid, data, expires) VALUES (?, ?, ?)",
+            (session.sid, self.serializer.dumps(dict(session)), now + self.ttl),
+        )
+        self._writes += 1
+        if self._writes % self.sweep_every == 0:
+            self.sweep(now)
+
+        if session.new:
+            response.set_cookie(
+                name,
+                session.sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+
+    def sweep(self, now: float | None = None) -> int:
+        # Expired rows are dropped in one statement every `sweep_every` writes
+        cur = self._db().execute("DELETE FROM sessions WHERE expires <= ?", (now or time.time(),))
+        return cur.rowcount
+
+
+def init_sessions(app, store=None) -> None:
+    if os.environ.get("SECRET_KEY"):
+        app.secret_key = os.environ["SECRET_KEY"]
+    elif os.environ.get("SECRET_KEY_FILE"):
+        with open(os.environ["SECRET_KEY_FILE"]) as f:
+            app.secret_key = f.read().strip()
+    elif store is not None and store.shared:
+        # only a store every worker/node talks to can hand out one key ("local" is per process)
+        app.secret_key = store_secret_key(store)
+    else:
+        app.secret_key = shared_secret_key(os.path.join(app.instance_path, "secret_key"))
+    if os.environ.get("SECRET_KEY_FALLBACKS"):
+        app.config["SECRET_KEY_FALLBACKS"] = os.environ["SECRET_KEY_FALLBACKS"].split(",")
+    if os.environ.get("SESSION_BACKEND") == "sqlite":
+        db_path = os.environ.get("SESSION_DB") or os.path.join(app.instance_path, "sessions.db")
+        app.session_interface = SqliteSessionInterface(
+            db_path, ttl=float(os.environ.get("SESSION_TTL", 24 * 3600))
+        )
@@ -0,0 +1,277 @@
+# store.py
+# Shared state for running several app nodes behind a load balancer:
+# - the session signing key, created once and handed to every node
+# - a shared cache tier (rendered result pages) and live analytics counters
+#
+# SHARED_STORE picks the implementation:
+#   local                   in-process (per worker: caches only, the key comes from the instance folder)
+#   /path/to.sock           a store server on a unix socket (the local stand-in)
+#   127.0.0.1:port          a store server over TCP, loopback only
+#
+# The stand-in has no authentication, and it hands the signing key and cached pages
+# to any client. It therefore only listens on a unix socket (mode 0600) or on loopback.
+# Nodes on other machines need a real store with auth behind open_store().
+#
+#   python store.py serve /tmp/michel-store.sock
+#
+# set() entries are cache: they may expire or be evicted (LRU, bounded by count and
+# by bytes: --max-items / --max-bytes). add() / incr() entries
+# (the signing key, counters) are never evicted. The stand-in keeps everything in
+# memory, so restarting it hands out a new key: use SECRET_KEY / SECRET_KEY_FILE in
+# production and the store for dev / tests.
+from __future__ import annotations
+import argparse
+import logging
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+# request:  op, ttl (0 = none), key length, value length | key | value
+# response: found, value length | value
+REQUEST = struct.Struct("<cdHI")
+RESPONSE = struct.Struct("<?I")
+
+
+class LocalStore:
+    shared = False  # one per process: every gunicorn worker gets its own
+
+    def __init__(self, max_items: int = 100_000, max_bytes: int = 64 << 20):
+        # set() entries are bounded by count and by size (keys + values); add() / incr() ones aren't
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._cache: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()  # LRU, key -> (value, expires)
+        self._bytes = 0
+        self._pinned: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            value = self._pinned.get(key)
+            if value is not None:
+                return value
+            item = self._cache.get(key)
+            if item is None:
+                return None
+            if item[1] and item[1] < time.time():
+                del self._cache[key]
+                self._bytes -= len(key) + len(item[0])
+                return None
+            self._cache.move_to_end(key)
+            return item[0]
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            old = self._cache.pop(key, None)
+            if old is not None:
+                self._bytes -= len(key) + len(old[0])
+            self._cache[key] = (value, time.time() + ttl if ttl else 0.0)
+            self._bytes += len(key) + len(value)
+            while len(self._cache) > self.max_items or self._bytes > self.max_bytes:
+                old_key, (old_value, _) = self._cache.popitem(last=False)
+                self._bytes -= len(old_key) + len(old_value)
+
+    def add(self, key: str, value: bytes) -> bool:
+        # set-if-absent; the first caller wins and every caller then get()s the same value
+        with self._lock:
+            if key in self._pinned:
+                return False
+            self._pinned[key] = value
+            return True
+
+    def incr(self, key: str, n: int = 1) -> int:
+        with self._lock:
+            value = int(self._pinned.get(key, b"0")) + n
+            self._pinned[key] = str(value).encode()
+            return value
+
+
+# -------------------------
+# Socket stand-in: client + server
+# -------------------------
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("store closed the connection")
+        buf += chunk
+    return bytes(buf)
+
+
+LOOPBACK = {"127.0.0.1", "localhost", "::1"}
+
+
+def _address(address: str):
+    # -> (socket family, address)
+    if address.startswith("/") or address.startswith("."):
+        return socket.AF_UNIX, address
+    host, port = address.rsplit(":", 1)
+    host = host.strip("[]")
+    if host not in LOOPBACK:
+        raise ValueError(f"store address {address}: the stand-in has no auth, use a unix socket or loopback")
+    return (socket.AF_INET6 if ":" in host else socket.AF_INET), (host, int(port))
+
+
+class SocketStore:
+    # Same interface as LocalStore. One connection per thread (and per process, so
+    # forked workers never share a socket). If the server is unreachable every call
+    # degrades to a miss: pages still render, counters are skipped.
+    # Circuit breaker: after a failure, calls return a miss at once for a backoff that
+    # doubles up to max_backoff; then a single call probes the server again. So a store
+    # that is down costs one timeout per backoff period, not one per request.
+    shared = True
+
+    def __init__(self, address: str, timeout: float = 0.5, backoff: float = 1.0, max_backoff: float = 30.0):
+        self.family, self.address = _address(address)
+        self.timeout = timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._local = threading.local()
+        self._failures = 0
+        self._down_until = 0.0
+        self._probe = threading.Lock()
+
+    def _sock(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None or self._local.pid != os.getpid():
+            sock = socket.socket(self.family, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.address)
+            self._local.sock, self._local.pid = sock, os.getpid()
+        return sock
+
+    def _call(self, op: bytes, key: str, value: bytes = b"", ttl: float = 0.0) -> Optional[bytes]:
+        probing = False
+        if self._failures:
+            # open circuit: miss at once, until one caller gets to probe
+            if time.monotonic() < self._down_until or not self._probe.acquire(blocking=False):
+                return None
+            probing = True
+        k = key.encode("utf-8")
+        try:
+            sock = self._sock()
+            sock.sendall(REQUEST.pack(op, ttl, len(k), len(value)) + k + value)
+            found, length = RESPONSE.unpack(_recv_exact(sock, RESPONSE.size))
+            data = _recv_exact(sock, length)
+        except OSError as e:
+            sock = getattr(self._local, "sock", None)
+            if sock is not None:
+                sock.close()
+            self._local.sock = None
+            if not self._failures:
+                log.warning("shared store %s unreachable: %s", self.address, e)
+            self._failures += 1
+            self._down_until = time.monotonic() + min(self.backoff * 2 ** (self._failures - 1), self.max_backoff)
+            return None
+        finally:
+            if probing:
+                self._probe.release()
+        if self._failures:
+            log.warning("shared store %s is back", self.address)
+            self._failures = 0
+        return data if found else None
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._call(b"g", key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        self._call(b"s", key, value, ttl or 0.0)
+
+    def add(self, key: str, value: bytes) -> bool:
+        return self._call(b"a", key, value) == b"1"
+
+    def incr(self, key: str, n: int = 1) -> int:
+        result = self._call(b"i", key, str(n).encode())
+        return int(result) if result is not None else 0
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        store: LocalStore = self.server.store
+        while True:
+            header = self.rfile.read(REQUEST.size)
+            if len(header) < REQUEST.size:
+                return
+            op, ttl, key_len, value_len = REQUEST.unpack(header)
+            key = self.rfile.read(key_len).decode("utf-8")
+            value = self.rfile.read(value_len)
+            if op == b"g":
+                result = store.get(key)
+            elif op == b"s":
+                store.set(key, value, ttl or None)
+                result = b""
+            elif op == b"a":
+                result = b"1" if store.add(key, value) else b"0"
+            elif op == b"i":
+                result = str(store.incr(key, int(value))).encode()
+            else:
+                return
+            found = result is not None
+            self.wfile.write(RESPONSE.pack(found, len(result or b"")) + (result or b""))
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _TCP6Server(_TCPServer):
+    address_family = socket.AF_INET6
+
+
+def serve(address: str, max_items: int = 100_000, max_bytes: int = 64 << 20) -> None:
+    family, addr = _address(address)
+    if family == socket.AF_UNIX and os.path.exists(addr):
+        os.unlink(addr)
+    if family == socket.AF_UNIX:
+        old_umask = os.umask(0o177)  # socket file 0600: only this user can connect
+        try:
+            server = _UnixServer(addr, _Handler)
+        finally:
+            os.umask(old_umask)
+    else:
+        server = (_TCP6Server if family == socket.AF_INET6 else _TCPServer)(addr, _Handler)
+    server.store = LocalStore(max_items, max_bytes)
+    print(f"store listening on {address}", flush=True)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if family == socket.AF_UNIX and os.path.exists(addr):
+            os.unlink(addr)
+
+
+def open_store(spec: Optional[str]):
+    # SHARED_STORE value -> store, or None when unset
+    if not spec:
+        return None
+    if spec == "local":
+        return LocalStore()
+    return SocketStore(spec)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Shared store stand-in server")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("serve")
+    p.add_argument("address", help="unix socket path or host:port")
+    p.add_argument("--max-items", type=int, default=100_000)
+    p.add_argument("--max-bytes", type=int, default=64 << 20, help="size bound for cached entries")
+    args = parser.parse_args()
+    if args.cmd == "serve":
+        serve(args.address, args.max_items, args.max_bytes)
+
+
+if __name__ == "__main__":
+    main()
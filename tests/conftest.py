@@ -0,0 +1,5 @@
+# The app is a flat set of modules in the repo root, not a package
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
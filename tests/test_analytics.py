@@ -0,0 +1,24 @@
+from analytics import aggregate
+from michel_quiz import QUIZ, START, record_answer
+
+
+def _run(answers, finish=False):
+    # the records one run writes: START, then its progress after each answer
+    progress = START
+    records = [(0, progress, 0)]
+    for i, option_idx in enumerate(answers):
+        progress = record_answer(progress, option_idx)
+        last = finish and i == len(answers) - 1
+        records.append((0, progress, QUIZ.rank_michels(QUIZ.progress_traits(progress))[0][0].id if last else 0))
+    return records
+
+
+def test_funnel_counts_runs_that_just_stop():
+    n = len(QUIZ.questions)
+    records = _run([0] * n, finish=True) + _run([1, 2]) + _run([]) + _run([3] * (n - 1))
+    agg = aggregate(records)
+    assert agg["funnel"][0] == 4 and agg["funnel"][1] == 3 and agg["funnel"][2] == 3 and agg["funnel"][n] == 1
+    assert agg["dropped_at"][0] == 1 and agg["dropped_at"][2] == 1 and agg["dropped_at"][n - 1] == 1
+    assert sum(agg["dropped_at"].values()) == 3 and sum(agg["winners"].values()) == 1
+    # each answer is picked once, whatever the number of records after it
+    assert agg["picks"][0] == {0: 1, 1: 1, 3: 1} and agg["picks"][1] == {0: 1, 2: 1, 3: 1}
@@ -0,0 +1,25 @@
+from app import app, counted_lru_cache
+
+
+def test_counted_lru_cache_counts_evictions():
+    calls = []
+
+    @counted_lru_cache(2)
+    def square(x):
+        calls.append(x)
+        return x * x
+
+    assert [square(x) for x in (1, 2, 1, 3, 2)] == [1, 4, 1, 9, 4]
+    # 3 evicts 2 (1 was used more recently), so 2 is computed again and evicts 1
+    assert calls == [1, 2, 3, 2]
+    assert square.cache_stats() == {"hits": 1, "misses": 4, "evictions": 2, "size": 2, "maxsize": 2}
+    square.cache_clear()
+    assert square.cache_stats()["size"] == 0
+
+
+def test_cache_stats_on_metrics():
+    text = app.test_client().get("/metrics").get_data(as_text=True)
+    for cache in ("outcomes", "pages"):
+        assert f'michel_cache_evictions_total{{cache="{cache}",' in text
+        assert f'michel_cache_maxsize{{cache="{cache}",' in text
+    assert "# TYPE michel_cache_hits_total counter" in text
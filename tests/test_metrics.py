@@ -0,0 +1,31 @@
+import time
+
+import metrics
+from app import app
+
+REMOTE = {"REMOTE_ADDR": "203.0.113.7"}
+
+
+def test_metrics_needs_loopback_or_token(monkeypatch):
+    client = app.test_client()
+    assert client.get("/metrics").status_code == 200
+    assert client.get("/metrics", environ_base=REMOTE).status_code == 404
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "s3cret")
+    assert client.get("/metrics", environ_base=REMOTE, headers={"Authorization": "Bearer nope"}).status_code == 404
+    assert client.get("/metrics", environ_base=REMOTE, headers={"Authorization": "Bearer s3cret"}).status_code == 200
+
+
+def test_profiler_toggle_is_post_with_token(monkeypatch):
+    client = app.test_client()
+    client.get("/metrics/profile?enable=1")
+    assert not metrics.PROFILER.running  # a GET never starts it
+    assert client.post("/metrics/profile?enable=1").status_code == 403  # no token configured
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "s3cret")
+    assert client.post("/metrics/profile?enable=1").status_code == 403
+    auth = {"Authorization": "Bearer s3cret"}
+    try:
+        assert b"running" in client.post("/metrics/profile?enable=1", headers=auth).data
+    finally:
+        client.post("/metrics/profile?enable=0", headers=auth)
+    time.sleep(2 * metrics.PROFILER.interval)
+    assert not metrics.PROFILER.running
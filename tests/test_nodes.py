@@ -0,0 +1,49 @@
+# Two app nodes (own instance folders, so no shared key file) behind a non-sticky
+# round-robin client, as in `python bench.py nodes`
+import os
+import random
+import subprocess
+import sys
+import time
+
+import pytest
+
+pytest.importorskip("gunicorn")
+
+from bench import run_quiz, start_gunicorn
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def store_address(tmp_path):
+    address = str(tmp_path / "store.sock")
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, "store.py"), "serve", address],
+                              stdout=subprocess.DEVNULL)
+    deadline = time.time() + 10
+    while not os.path.exists(address):
+        assert time.time() < deadline, "store server did not start"
+        time.sleep(0.05)
+    yield address
+    server.terminate()
+    server.wait()
+
+
+def _runs(tmp_path, env, n=8):
+    nodes = [start_gunicorn(1, {**env, "INSTANCE_PATH": str(tmp_path / f"node{i}")}) for i in range(2)]
+    try:
+        rng = random.Random(0)
+        return [run_quiz([base for _, base in nodes], rng) for _ in range(n)]
+    finally:
+        for proc, _ in nodes:
+            proc.terminate()
+            proc.wait()
+
+
+def test_shared_store_keeps_sessions(tmp_path, store_address):
+    assert _runs(tmp_path, {"SHARED_STORE": store_address}) == [18] * 8
+
+
+def test_without_store_sessions_are_lost(tmp_path):
+    # the check above can fail: every node signs with its own key
+    assert -1 in _runs(tmp_path, {"SHARED_STORE": "", "SECRET_KEY": "", "SECRET_KEY_FILE": ""})
@@ -0,0 +1,65 @@
+import random
+
+from michel_quiz import QUIZ, START, add_traits, answer_indexes, answered_count, record_answer
+
+
+def _replay(answers):
+    traits = QUIZ.empty_traits()
+    for q, option_idx in zip(QUIZ.questions, answers):
+        traits = add_traits(traits, q.options[option_idx].delta)
+    return traits
+
+
+def test_start_has_no_answers():
+    assert answered_count(START) == 0
+    assert answer_indexes(START) == []
+
+
+def test_round_trip():
+    rng = random.Random(0)
+    for _ in range(200):
+        answers = [rng.randrange(4) for _ in range(rng.randrange(len(QUIZ.questions) + 1))]
+        progress = START
+        for option_idx in answers:
+            progress = record_answer(progress, option_idx)
+        assert answered_count(progress) == len(answers)
+        assert answer_indexes(progress) == answers
+
+
+def test_leading_zero_answers_are_kept():
+    # option A is 0: the start bit keeps "A, A, A" distinct from no answers
+    progress = START
+    for _ in range(3):
+        progress = record_answer(progress, 0)
+    assert answer_indexes(progress) == [0, 0, 0]
+
+
+def test_progress_traits_matches_replay():
+    rng = random.Random(1)
+    for _ in range(100):
+        answers = [rng.randrange(len(q.options)) for q in QUIZ.questions]
+        progress = START
+        for option_idx in answers:
+            progress = record_answer(progress, option_idx)
+        assert QUIZ.progress_traits(progress) == _replay(answers)
+
+
+def test_extra_answers_are_ignored():
+    # progress from before a quiz swap to fewer questions
+    answers = [1] * len(QUIZ.questions)
+    progress = START
+    for option_idx in answers:
+        progress = record_answer(progress, option_idx)
+    assert QUIZ.progress_traits(record_answer(progress, 2)) == QUIZ.progress_traits(progress)
+
+
+def test_only_prefixes_are_cached():
+    progress = START
+    for _ in QUIZ.questions:
+        progress = record_answer(progress, 1)
+    assert QUIZ.progress_traits(progress) == _replay([1] * len(QUIZ.questions))
+    # a finished run is computed from its cached prefix, and not stored itself
+    assert QUIZ.progress_traits(progress) is not QUIZ.progress_traits(progress)
+    assert QUIZ.progress_traits(progress >> 2) is QUIZ.progress_traits(progress >> 2)
+    assert QUIZ.progress_state(progress) is not QUIZ.progress_state(progress)
+    assert QUIZ.progress_state(progress >> 2) is QUIZ.progress_state(progress >> 2)
@@ -0,0 +1,68 @@
+import random
+from bisect import bisect_right
+
+from michel_quiz import LEVELS, QUIZ, level_code
+
+
+def _reference(winner_id, traits):
+    # The original rule: unconditional lines, plus every line whose trait is at its level; max 3
+    lines = []
+    for it in QUIZ.punchlines.get(winner_id, []):
+        if isinstance(it, str):
+            lines.append(it)
+        elif LEVELS[bisect_right(QUIZ.thresholds, traits.get(it[0], 0))] == it[1]:
+            lines.append(it[2])
+    return lines[:3]
+
+
+def _samples(n=500):
+    # sampled runs, plus values right at / around the level thresholds
+    rng = random.Random(0)
+    edges = [v + d for v in QUIZ.thresholds for d in (-1, 0, 1)] + [-5, 0, 20]
+    out = QUIZ.sample_traits(n)
+    out += [{t: rng.choice(edges) for t in QUIZ.traits} for _ in range(n)]
+    return out
+
+
+def test_level_code():
+    low, medium, high = 0, QUIZ.thresholds[0], QUIZ.thresholds[1]
+    assert level_code({}, (), QUIZ.thresholds) == 0
+    traits = {"a": low, "b": medium, "c": high}
+    assert level_code(traits, ("a", "b", "c"), QUIZ.thresholds) == 0 * 9 + 1 * 3 + 2
+    assert level_code(traits, ("c", "missing"), QUIZ.thresholds) == 2 * 3 + 0
+
+
+def test_decision_tables_match_reference():
+    for traits in _samples():
+        for m in QUIZ.michels:
+            assert QUIZ.pick_punchlines(m.id, traits) == _reference(m.id, traits)
+
+
+def test_many_matches_single():
+    rows = [(m.id, traits) for traits in _samples(100) for m in QUIZ.michels]
+    expected = [QUIZ.pick_punchlines(w, traits) for w, traits in rows]
+    assert QUIZ.pick_punchlines_many(rows) == expected
+    # sequences in trait order give the same answer as dicts
+    assert QUIZ.pick_punchlines_many((w, QUIZ.trait_vector(traits)) for w, traits in rows) == expected
+
+
+def test_unknown_winner():
+    assert QUIZ.pick_punchlines(10_000, QUIZ.empty_traits()) == []
+
+
+def test_validate_limits_condition_traits():
+    import json
+    import os
+
+    import quiz_compiler
+
+    with open(os.path.join(os.path.dirname(__file__), "..", "quizzes", "michel.json"), encoding="utf-8") as f:
+        src = json.load(f)
+    extra = [f"extra_{i}" for i in range(quiz_compiler.MAX_PUNCHLINE_TRAITS + 1 - len(src["traits"]))]
+    src["traits"] += extra
+    cid = next(iter(src["punchlines"]))
+    src["punchlines"][cid] = [{"trait": t, "level": "high", "line": t} for t in src["traits"]]
+    errors, _ = quiz_compiler.validate(src)
+    assert any(e.startswith(f"punchlines {cid}: conditions on at most") for e in errors)
+    src["punchlines"][cid].pop()
+    assert quiz_compiler.validate(src)[0] == []
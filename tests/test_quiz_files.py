@@ -0,0 +1,100 @@
+import json
+import os
+import shutil
+
+import pytest
+
+import quiz_compiler
+from michel_quiz import QuizFile, QuizRegistry
+
+SOURCE = os.path.join(os.path.dirname(__file__), "..", "quizzes", "michel.json")
+
+
+def _load_source():
+    with open(SOURCE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write(path, data, bump):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(data if isinstance(data, str) else json.dumps(data))
+    os.utime(path, (bump, bump))  # mtime resolution must not hide the edit
+
+
+@pytest.fixture
+def quiz_file(tmp_path):
+    path = tmp_path / "michel.json"
+    shutil.copy(SOURCE, path)
+    os.utime(path, (1000, 1000))
+    errors, swaps = [], []
+    qf = QuizFile(str(path), interval=0, on_error=errors.append, on_swap=lambda old, new: swaps.append((old, new)))
+    return qf, str(path), errors, swaps
+
+
+def test_edit_swaps_quiz(quiz_file):
+    qf, path, errors, swaps = quiz_file
+    before = qf.get()
+    src = _load_source()
+    src["questions"][0]["text"] += " (edited)"
+    _write(path, src, 2000)
+    after = qf.get()
+    assert after is not before and after.questions[0].text.endswith("(edited)")
+    assert swaps == [(before, after)] and errors == []
+    assert qf.get() is after  # unchanged file: no reload
+
+
+def test_broken_edit_keeps_serving(quiz_file):
+    qf, path, errors, swaps = quiz_file
+    before = qf.get()
+    _write(path, "{not json", 2000)
+    assert qf.get() is before
+    assert len(errors) == 1 and swaps == []
+
+
+def test_invalid_edit_keeps_serving(quiz_file):
+    qf, path, errors, swaps = quiz_file
+    before = qf.get()
+    src = _load_source()
+    src["questions"][0]["options"] = []
+    _write(path, src, 2000)
+    assert qf.get() is before
+    assert len(errors) == 1 and "options" in str(errors[0]) and swaps == []
+
+
+def test_slug_change_is_rejected(quiz_file):
+    qf, path, errors, swaps = quiz_file
+    before = qf.get()
+    src = _load_source()
+    src["slug"] = "michel2"
+    _write(path, src, 2000)
+    assert qf.get() is before and before.slug == "michel"
+    assert len(errors) == 1 and "slug changed" in str(errors[0]) and swaps == []
+
+
+def test_validate_reports_structure_errors():
+    src = _load_source()
+    assert quiz_compiler.validate(src)[0] == []
+    src["slug"] = ""
+    src["questions"][0]["options"] = "yes"
+    del src["characters"][0]["name"]
+    errors, _ = quiz_compiler.validate(src)
+    assert len(errors) >= 3
+    assert any(e.startswith("slug") for e in errors)
+
+
+@pytest.mark.parametrize("slug", ["", "Michel", "-michel", "mi/chel", "../x", "a" * 65, 5, "static", "metrics"])
+def test_validate_rejects_unsafe_slugs(slug):
+    src = _load_source()
+    src["slug"] = slug
+    assert any(e.startswith("slug") for e in quiz_compiler.validate(src)[0])
+
+
+def test_scan_reports_duplicate_slugs(tmp_path):
+    for stem in ("a", "b"):
+        shutil.copy(SOURCE, tmp_path / f"{stem}.json")
+    errors = []
+    registry = QuizRegistry()
+    registry.scan(str(tmp_path), on_error=errors.append)
+    assert list(registry) == ["michel"]
+    assert registry.files["michel"].source.endswith("a.json")
+    assert len(errors) == 1 and "b.json" in str(errors[0]) and "already served" in str(errors[0])
@@ -0,0 +1,30 @@
+import pytest
+
+from michel_quiz import QUIZ
+
+np = pytest.importorskip("numpy")
+
+
+def _rows():
+    # sampled runs, plus rows that tie: all zeros, each profile and its multiples
+    rows = [QUIZ.trait_vector(t) for t in QUIZ.sample_traits(2000)]
+    rows.append(tuple(0 for _ in QUIZ.traits))
+    for m in QUIZ.michels:
+        p = QUIZ.trait_vector(m.profile)
+        rows += [p, tuple(2 * x for x in p), tuple(-x for x in p)]
+    return rows
+
+
+def test_rank_matrix_matches_rank_many():
+    rows = _rows()
+    ids, scores = QUIZ.rank_matrix(rows)
+    for row, ranked, winner_id, score in zip(rows, QUIZ.rank_many(rows), ids.tolist(), scores.tolist()):
+        # same winner on ties (first Michel in quiz order) and the same score, bit for bit
+        assert (winner_id, score) == (ranked[0][0].id, ranked[0][1]), row
+
+
+def test_rank_matrix_builds_profiles_once():
+    QUIZ.rank_matrix(_rows()[:10])
+    first = QUIZ._profile_matrix
+    QUIZ.rank_matrix(_rows()[:10])
+    assert QUIZ._profile_matrix is first
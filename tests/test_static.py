@@ -0,0 +1,102 @@
+import asyncio
+import os
+
+import pytest
+
+import asgi
+from app import app
+from assets import Asset
+
+FILE = "pics/michel_hedgehog.jpg"
+
+
+@pytest.fixture(scope="module")
+def client():
+    return app.test_client()
+
+
+@pytest.fixture(scope="module")
+def data():
+    with open(os.path.join(app.static_folder, FILE), "rb") as f:
+        return f.read()
+
+
+def _get(client, **headers):
+    return client.get(f"/static/{FILE}", headers=headers)
+
+
+def test_full(client, data):
+    r = _get(client)
+    assert r.status_code == 200
+    assert r.headers["Accept-Ranges"] == "bytes"
+    assert int(r.headers["Content-Length"]) == len(data)
+    assert r.data == data
+
+
+def test_range(client, data):
+    r = _get(client, Range="bytes=100-199")
+    assert r.status_code == 206
+    assert r.headers["Content-Range"] == f"bytes 100-199/{len(data)}"
+    assert r.data == data[100:200]
+
+
+def test_suffix_range(client, data):
+    r = _get(client, Range="bytes=-10")
+    assert r.status_code == 206
+    assert r.data == data[-10:]
+
+
+def test_unsatisfiable_range(client, data):
+    r = _get(client, Range=f"bytes={len(data)}-")
+    assert r.status_code == 416
+    assert r.headers["Content-Range"] == f"bytes */{len(data)}"
+
+
+def test_multiple_ranges_get_the_whole_file(client, data):
+    r = _get(client, Range="bytes=0-9,20-29")
+    assert r.status_code == 200
+    assert r.data == data
+
+
+def test_if_range(client, data):
+    etag = _get(client).headers["ETag"]
+    assert _get(client, Range="bytes=0-9", **{"If-Range": etag}).status_code == 206
+    stale = _get(client, Range="bytes=0-9", **{"If-Range": '"stale"'})
+    assert stale.status_code == 200
+    assert stale.data == data
+
+
+def test_not_modified(client):
+    etag = _get(client).headers["ETag"]
+    r = _get(client, **{"If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.data == b""
+
+
+def _asgi_get(filename, asset, headers=()):
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": f"/static/{filename}", "query_string": b"",
+             "headers": [(k.encode(), v.encode()) for k, v in headers], "http_version": "1.1"}
+    asyncio.run(asyncio.wait_for(asgi._static(scope, send, asset, filename), 5))
+    return messages
+
+
+def test_asgi_range(data):
+    asset = app.extensions["assets"][FILE]
+    messages = _asgi_get(FILE, asset, [("range", "bytes=100-199")])
+    assert messages[0]["status"] == 206
+    assert b"".join(m.get("body", b"") for m in messages[1:]) == data[100:200]
+    assert not messages[-1].get("more_body")
+
+
+def test_asgi_empty_file_completes(tmp_path, monkeypatch):
+    (tmp_path / "empty.txt").write_bytes(b"")
+    monkeypatch.setattr(asgi.flask_app, "static_folder", str(tmp_path))
+    messages = _asgi_get("empty.txt", Asset("0" * 12, "0" * 64, "text/plain", 0.0))
+    assert messages[0]["status"] == 200
+    assert messages[-1]["type"] == "http.response.body"
+    assert not messages[-1].get("more_body")
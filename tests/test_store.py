@@ -0,0 +1,29 @@
+import time
+
+from store import LocalStore
+
+
+def test_cache_bounded_by_bytes():
+    s = LocalStore(max_items=100, max_bytes=1000)
+    for i in range(10):
+        s.set(f"k{i}", b"x" * 198)  # 200 bytes with the key
+    assert s._bytes <= 1000
+    assert s.get("k0") is None and s.get("k9") == b"x" * 198
+    s.set("k9", b"y")  # replacing an entry releases its old size
+    assert s._bytes == sum(len(k) + len(v) for k, (v, _) in s._cache.items())
+
+
+def test_pinned_entries_are_not_evicted():
+    s = LocalStore(max_items=1, max_bytes=10)
+    assert s.add("key", b"secret" * 10)
+    s.incr("n")
+    s.set("a", b"1")
+    s.set("b", b"2")
+    assert s.get("key") == b"secret" * 10 and s.get("n") == b"1" and s.get("a") is None
+
+
+def test_ttl():
+    s = LocalStore()
+    s.set("k", b"v", ttl=0.01)
+    time.sleep(0.02)
+    assert s.get("k") is None and s._bytes == 0